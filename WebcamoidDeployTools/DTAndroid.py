@@ -210,7 +210,11 @@ def preRun(globs, configs, dataDir):
                           stripCmd)
     print()
     print('Stripping symbols')
-    solver.stripSymbols(dataDir)
+
+    for binary, (status, message) in sorted(solver.stripSymbols(dataDir).items()):
+        if status == 'failed':
+            print('Failed to strip {}: {}'.format(binary, message))
+
     print('Removing unnecessary files')
     removeUnneededFiles(libDir)
     print()
@@ -22,7 +22,6 @@
 import configparser
 import os
 import subprocess
-import tempfile
 
 from . import DTUtils
 
@@ -48,7 +47,7 @@ def createAppImage(globs,
                    desktopIcon,
                    dirIcon,
                    verbose):
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with DTUtils.stagingDir(os.path.dirname(outPackage)) as tmpdir:
         appDirName = os.path.splitext(os.path.basename(outPackage))[0]
         appDir = \
             os.path.join(tmpdir,
@@ -57,7 +56,7 @@ def createAppImage(globs,
         if not os.path.exists(appDir):
             os.makedirs(appDir)
 
-        DTUtils.copy(dataDir, appDir)
+        DTUtils.copy(dataDir, appDir, hardlinks=True)
         launcherSrc = os.path.join(appDir, os.path.relpath(launcher, dataDir))
         launcherDst = os.path.join(appDir, 'AppRun')
         DTUtils.move(launcherSrc, launcherDst)
@@ -0,0 +1,1086 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2021  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import bz2
+import collections
+import concurrent.futures
+import io
+import lzma
+import os
+import queue
+import shutil
+import stat
+import struct
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+
+from . import DTUtils
+
+
+CLASSIFIER_STATS = {}
+CLASSIFIER_STATS_MUTEX = threading.Lock()
+
+class DataClassifier:
+    # Detects already compressed data with a fast trial compression of a
+    # small sample. Small files are cheaper to compress than to check.
+    def __init__(self,
+                 ratioThreshold=0.9,
+                 sampleSize=16 * 1024,
+                 minSize=64 * 1024):
+        super().__init__()
+        self.ratioThreshold = ratioThreshold
+        self.sampleSize = sampleSize
+        self.minSize = minSize
+
+    def isWorthChecking(self, size):
+        return size >= self.minSize
+
+    def sample(self, data, slices=4):
+        if len(data) <= self.sampleSize:
+            return data
+
+        # Take the sample from several places of big blocks, since they may
+        # contain many files.
+        sliceSize = self.sampleSize // slices
+        step = (len(data) - sliceSize) // (slices - 1)
+
+        return b''.join(data[i * step: i * step + sliceSize]
+                        for i in range(slices))
+
+    def isCompressible(self, data):
+        sample = self.sample(data)
+
+        # Not worth checking.
+        if len(sample) < 512:
+            return True
+
+        ratio = len(zlib.compress(sample, 1)) / len(sample)
+
+        return ratio < self.ratioThreshold
+
+class PrefixedReader:
+    # Reads the data already read from the start of the file, and then the
+    # rest of the file.
+    def __init__(self, prefix, fileobj):
+        super().__init__()
+        self.prefix = prefix
+        self.fileobj = fileobj
+
+    def read(self, size=-1):
+        if len(self.prefix) < 1:
+            return self.fileobj.read(size)
+
+        if size < 0 or size > len(self.prefix):
+            data = self.prefix
+            self.prefix = b''
+
+            return data + self.fileobj.read(size - len(data) if size >= 0 else -1)
+
+        data = self.prefix[: size]
+        self.prefix = self.prefix[size:]
+
+        return data
+
+def dataClassifier(configs):
+    # Off by default, it only pays off in trees with many big compressed
+    # files.
+    storeIncompressible = configs.get('Package', 'storeIncompressible', fallback='false').strip()
+    storeIncompressible = DTUtils.toBool(storeIncompressible)
+
+    if not storeIncompressible:
+        return None
+
+    ratioThreshold = configs.get('Package', 'incompressibleRatio', fallback='0.9').strip()
+    ratioThreshold = DTUtils.toFloat(ratioThreshold, 0.9)
+    minSize = configs.get('Package', 'incompressibleMinSize', fallback='65536').strip()
+    minSize = DTUtils.toInt(minSize, 64 * 1024)
+
+    return DataClassifier(ratioThreshold, minSize=minSize)
+
+def codecStats(codec):
+    if not codec in CLASSIFIER_STATS:
+        CLASSIFIER_STATS[codec] = {'storedFiles': 0,
+                                   'storedBytes': 0,
+                                   'compressedBytes': 0,
+                                   'compressTime': 0.0}
+
+    return CLASSIFIER_STATS[codec]
+
+def recordStored(codec, size, files=0):
+    with CLASSIFIER_STATS_MUTEX:
+        stats = codecStats(codec)
+        stats['storedFiles'] += files
+        stats['storedBytes'] += size
+
+def recordCompressed(codec, size, seconds):
+    with CLASSIFIER_STATS_MUTEX:
+        stats = codecStats(codec)
+        stats['compressedBytes'] += size
+        stats['compressTime'] += seconds
+
+def codecsStats():
+    with CLASSIFIER_STATS_MUTEX:
+        return {codec: dict(stats) for codec, stats in CLASSIFIER_STATS.items()}
+
+def resetCodecsStats():
+    with CLASSIFIER_STATS_MUTEX:
+        CLASSIFIER_STATS.clear()
+
+def mergeCodecsStats(codecsStats):
+    # Add the statistics collected by another process.
+    with CLASSIFIER_STATS_MUTEX:
+        for codec, codecStatsDelta in codecsStats.items():
+            stats = codecStats(codec)
+
+            for key in stats:
+                stats[key] += codecStatsDelta.get(key, 0)
+
+def classifierStats():
+    storedFiles = 0
+    storedBytes = 0
+    savedTime = 0.0
+
+    with CLASSIFIER_STATS_MUTEX:
+        for stats in CLASSIFIER_STATS.values():
+            storedFiles += stats['storedFiles']
+            storedBytes += stats['storedBytes']
+
+            # Estimate the time it would have taken to compress the stored
+            # data with the speed measured for the rest of the data.
+            if stats['compressedBytes'] > 0:
+                savedTime += stats['storedBytes'] \
+                           * stats['compressTime'] \
+                           / stats['compressedBytes']
+
+    return {'storedFiles': storedFiles,
+            'storedBytes': storedBytes,
+            'savedTime': savedTime}
+
+def isArchivedLink(tar, path):
+    st = os.stat(path)
+
+    return st.st_nlink > 1 and (st.st_ino, st.st_dev) in tar.inodes
+
+def addTree(tar, path, arcname, classifier=None, deferred=None):
+    # Same as tar.add, but the incompressible files are added at the end,
+    # so they are grouped together in the same blocks.
+    if classifier is None:
+        tar.add(path, arcname)
+
+        return
+
+    isTop = deferred is None
+
+    if isTop:
+        deferred = []
+
+    if os.path.isfile(path) \
+        and not os.path.islink(path) \
+        and isArchivedLink(tar, path):
+        # Hardlinks to an archived file carry no data.
+        tar.add(path, arcname, recursive=False)
+    elif os.path.isfile(path) \
+        and not os.path.islink(path) \
+        and classifier.isWorthChecking(os.path.getsize(path)):
+        # The file is classified from the start of its data, which is then
+        # written to the archive without reading it again.
+        with open(path, 'rb') as f:
+            sample = f.read(classifier.sampleSize)
+
+            if classifier.isCompressible(sample):
+                tarinfo = tar.gettarinfo(arcname=arcname, fileobj=f)
+
+                if tarinfo.isreg():
+                    tar.addfile(tarinfo, PrefixedReader(sample, f))
+                else:
+                    tar.addfile(tarinfo)
+            else:
+                deferred.append((path, arcname))
+    else:
+        tar.add(path, arcname, recursive=False)
+
+        if os.path.isdir(path) and not os.path.islink(path):
+            for f in sorted(os.listdir(path)):
+                addTree(tar,
+                        os.path.join(path, f),
+                        os.path.join(arcname, f),
+                        classifier,
+                        deferred)
+
+    if isTop:
+        for filePath, fileArcname in deferred:
+            tar.add(filePath, fileArcname, recursive=False)
+
+def gzipBlock(level):
+    def compress(data):
+        # Every block is a complete gzip member, concatenated members are
+        # decompressed as a single stream by gzip and tar.
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+        return compressor.compress(data) + compressor.flush()
+
+    return compress
+
+def bzip2Block(level):
+    def compress(data):
+        return bz2.compress(data, level)
+
+    return compress
+
+def xzVarint(value):
+    data = bytearray()
+
+    while value >= 0x80:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+
+    data.append(value)
+
+    return bytes(data)
+
+def xzPadding(size):
+    return b'\x00' * (-size % 4)
+
+def xzDictSize(preset, blockSize):
+    # Dictionary sizes used by the xz presets, there is no point on using
+    # a dictionary bigger than the block.
+    dictSizes = [256 << 10,
+                 1 << 20,
+                 2 << 20,
+                 4 << 20,
+                 4 << 20,
+                 8 << 20,
+                 8 << 20,
+                 16 << 20,
+                 32 << 20,
+                 64 << 20]
+    dictSize = dictSizes[preset]
+
+    return max(min(dictSize, blockSize), 4096)
+
+def xzBlock(preset, dictSize):
+    filters = [{'id': lzma.FILTER_LZMA2,
+                'preset': preset,
+                'dict_size': dictSize}]
+
+    # Smallest dictionary size that can be represented in the LZMA2
+    # properties byte and still covers the used dictionary.
+    dictProp = 0
+
+    while (2 | (dictProp & 1)) << (dictProp // 2 + 11) < dictSize:
+        dictProp += 1
+
+    def compress(data):
+        compressed = lzma.compress(data, lzma.FORMAT_RAW, filters=filters)
+
+        # Block flags: one filter, compressed and uncompressed sizes
+        # present.
+        header = b'\x00\xc0' \
+               + xzVarint(len(compressed)) \
+               + xzVarint(len(data)) \
+               + b'\x21\x01' \
+               + bytes([dictProp])
+        header += xzPadding(len(header) + 4)
+        header = bytes([(len(header) + 4) // 4 - 1]) + header[1:]
+        header += struct.pack('<I', zlib.crc32(header))
+        check = struct.pack('<I', zlib.crc32(data))
+        unpaddedSize = len(header) + len(compressed) + len(check)
+        block = header + compressed + xzPadding(len(compressed)) + check
+
+        return block, unpaddedSize, len(data)
+
+    return compress
+
+class ParallelCompressWriter:
+    def __init__(self,
+                 fileobj,
+                 compress,
+                 blockSize,
+                 threads=0,
+                 storeCompress=None,
+                 classifier=None,
+                 codec=''):
+        super().__init__()
+        self.fileobj = fileobj
+        self.compress = compress
+        self.storeCompress = storeCompress
+        self.classifier = classifier
+        self.codec = codec
+        self.blockSize = blockSize
+        self.threads = threads if threads > 0 else DTUtils.numThreads()
+        self.executor = None
+        self.pending = collections.deque()
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+        if self.threads > 1:
+            self.executor = \
+                concurrent.futures.ThreadPoolExecutor(max_workers=self.threads)
+
+    def tell(self):
+        return self.position
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+
+        while len(self.buffer) >= self.blockSize:
+            block = bytes(self.buffer[: self.blockSize])
+            del self.buffer[: self.blockSize]
+            self.submit(block)
+
+        return len(data)
+
+    def writeBlock(self, block):
+        self.fileobj.write(block)
+
+    def writeTrailer(self):
+        pass
+
+    def compressBlock(self, block):
+        # Blocks of incompressible data are just stored, or compressed with
+        # the fastest settings.
+        if self.classifier \
+            and self.storeCompress \
+            and not self.classifier.isCompressible(block):
+            recordStored(self.codec, len(block))
+
+            return self.storeCompress(block)
+
+        startTime = time.perf_counter()
+        data = self.compress(block)
+        recordCompressed(self.codec, len(block), time.perf_counter() - startTime)
+
+        return data
+
+    def submit(self, block):
+        if self.executor is None:
+            self.writeBlock(self.compressBlock(block))
+
+            return
+
+        self.pending.append(self.executor.submit(self.compressBlock, block))
+
+        # Keep a bounded number of blocks in memory, and write them in the
+        # same order they were read.
+        while len(self.pending) > 2 * self.threads:
+            self.writeBlock(self.pending.popleft().result())
+
+    def close(self, flush=True):
+        if self.closed:
+            return
+
+        self.closed = True
+
+        try:
+            if flush:
+                if len(self.buffer) > 0:
+                    self.submit(bytes(self.buffer))
+                    self.buffer = bytearray()
+
+                while len(self.pending) > 0:
+                    self.writeBlock(self.pending.popleft().result())
+
+                self.writeTrailer()
+        finally:
+            if self.executor:
+                self.executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close(excType is None)
+
+class XzWriter(ParallelCompressWriter):
+    # Stream flags, CRC32 check.
+    STREAM_FLAGS = b'\x00\x01'
+
+    def __init__(self,
+                 fileobj,
+                 compress,
+                 blockSize,
+                 threads=0,
+                 storeCompress=None,
+                 classifier=None,
+                 codec=''):
+        super().__init__(fileobj,
+                         compress,
+                         blockSize,
+                         threads,
+                         storeCompress,
+                         classifier,
+                         codec)
+        self.records = []
+        self.fileobj.write(b'\xfd7zXZ\x00'
+                           + self.STREAM_FLAGS
+                           + struct.pack('<I', zlib.crc32(self.STREAM_FLAGS)))
+
+    def writeBlock(self, block):
+        data, unpaddedSize, uncompressedSize = block
+        self.fileobj.write(data)
+        self.records.append((unpaddedSize, uncompressedSize))
+
+    def writeTrailer(self):
+        index = b'\x00' + xzVarint(len(self.records))
+
+        for unpaddedSize, uncompressedSize in self.records:
+            index += xzVarint(unpaddedSize) + xzVarint(uncompressedSize)
+
+        index += xzPadding(len(index))
+        index += struct.pack('<I', zlib.crc32(index))
+        footer = struct.pack('<I', len(index) // 4 - 1) + self.STREAM_FLAGS
+        self.fileobj.write(index
+                           + struct.pack('<I', zlib.crc32(footer))
+                           + footer
+                           + b'YZ')
+
+class DataTreeReader:
+    def __init__(self, maxChunks):
+        super().__init__()
+        self.queue = queue.Queue(maxChunks)
+        self.buffer = bytearray()
+        self.detached = False
+        self.finished = False
+
+    def put(self, item):
+        # Stop feeding the consumer if it gone away.
+        while not self.detached:
+            try:
+                self.queue.put(item, timeout=0.1)
+
+                return
+            except queue.Full:
+                pass
+
+    def detach(self):
+        self.detached = True
+
+    def nextChunk(self):
+        if self.finished:
+            return None
+
+        item = self.queue.get()
+
+        if isinstance(item, BaseException):
+            self.finished = True
+
+            raise item
+
+        if item is None:
+            self.finished = True
+
+        return item
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = self.nextChunk()
+
+            if chunk is None:
+                break
+
+            self.buffer += chunk
+
+        if size < 0:
+            size = len(self.buffer)
+
+        data = bytes(self.buffer[: size])
+        del self.buffer[: size]
+
+        return data
+
+    def __iter__(self):
+        if len(self.buffer) > 0:
+            yield self.read()
+
+        while True:
+            chunk = self.nextChunk()
+
+            if chunk is None:
+                break
+
+            yield chunk
+
+class DataTreeStream:
+    # Walks and reads the data directory once, and feeds the resulting tar
+    # stream to every archive format. The queues are bounded, so the
+    # slowest consumer sets the pace and the memory usage stays flat.
+    def __init__(self,
+                 dataDir,
+                 name,
+                 consumers,
+                 classifier=None,
+                 chunkSize=1024 * 1024,
+                 maxChunks=16):
+        super().__init__()
+        self.dataDir = dataDir
+        self.name = name
+        self.classifier = classifier
+        self.chunkSize = chunkSize
+        self.readers = {consumer: DataTreeReader(maxChunks)
+                        for consumer in consumers}
+        self.buffer = bytearray()
+        self.position = 0
+        self.thread = threading.Thread(target=self.produce)
+
+    def reader(self, consumer):
+        return self.readers.get(consumer)
+
+    def detach(self, consumer):
+        if consumer in self.readers:
+            self.readers[consumer].detach()
+
+    def start(self):
+        self.thread.start()
+
+    def join(self):
+        self.thread.join()
+
+    def tell(self):
+        return self.position
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+
+        if len(self.buffer) >= self.chunkSize:
+            self.publish(bytes(self.buffer))
+            self.buffer = bytearray()
+
+        return len(data)
+
+    def publish(self, item):
+        for reader in self.readers.values():
+            reader.put(item)
+
+    def produce(self):
+        try:
+            with tarfile.open(fileobj=self, mode='w') as tar:
+                addTree(tar, self.dataDir, self.name, self.classifier)
+
+            if len(self.buffer) > 0:
+                self.publish(bytes(self.buffer))
+                self.buffer = bytearray()
+
+            self.publish(None)
+        except BaseException as e:
+            self.publish(e)
+
+# Formats that can read the shared tar stream of the data directory.
+DATA_TREE_FORMATS = ['CompressedTarBz2',
+                     'CompressedTarGz',
+                     'CompressedTarXz',
+                     'CompressedTarZst',
+                     'CompressedZip']
+
+def dataTreeReader(globs, format):
+    if 'dataTree' in globs:
+        return globs['dataTree'].reader(format)
+
+    return None
+
+def writeTar(outPackage,
+             dataDir,
+             name,
+             compress,
+             blockSize,
+             threads=0,
+             writerClass=ParallelCompressWriter,
+             reader=None,
+             storeCompress=None,
+             classifier=None,
+             codec=''):
+    with open(outPackage, 'wb') as f:
+        with writerClass(f,
+                         compress,
+                         blockSize,
+                         threads,
+                         storeCompress,
+                         classifier,
+                         codec) as writer:
+            if reader:
+                for chunk in reader:
+                    writer.write(chunk)
+            else:
+                with tarfile.open(fileobj=writer, mode='w') as tar:
+                    addTree(tar, dataDir, name, classifier)
+
+# Extensions of files that are already compressed, deflating them again
+# just wastes time.
+ZIP_STORE_EXTENSIONS = ['.7z',
+                        '.apk',
+                        '.bz2',
+                        '.gz',
+                        '.jar',
+                        '.jpeg',
+                        '.jpg',
+                        '.mp3',
+                        '.mp4',
+                        '.ogg',
+                        '.png',
+                        '.webm',
+                        '.webp',
+                        '.xz',
+                        '.zip',
+                        '.zst']
+
+def zipDateTime(mtime):
+    # Zip can't represent dates before 1980.
+    return max(time.localtime(mtime)[0: 6], (1980, 1, 1, 0, 0, 0))
+
+def zipFileEntry(path, arcname):
+    # Symlinks are followed, a link to a directory is stored as an empty
+    # directory, like zipfile does.
+    zinfo = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+
+    return zinfo, b'' if zinfo.is_dir() else path
+
+def zipSymlinkEntry(arcname, target, mtime):
+    zinfo = zipfile.ZipInfo(arcname, zipDateTime(mtime))
+    zinfo.external_attr = (stat.S_IFLNK | 0o777) << 16
+
+    return zinfo, target.encode()
+
+def zipEntries(dataDir, name, storeSymlinks=False, path=None):
+    # The entries are sorted and the subdirectories walked right after
+    # listing them, the archive is the same in every run, and has the same
+    # order as the tar stream.
+    if path is None:
+        path = dataDir
+
+    try:
+        with os.scandir(path) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+    except OSError:
+        return
+
+    for entry in entries:
+        arcname = os.path.join(name, os.path.relpath(entry.path, dataDir))
+
+        if storeSymlinks and entry.is_symlink():
+            st = entry.stat(follow_symlinks=False)
+
+            yield zipSymlinkEntry(arcname,
+                                  os.readlink(entry.path),
+                                  st.st_mtime)
+        else:
+            yield zipFileEntry(entry.path, arcname)
+
+            if entry.is_dir(follow_symlinks=False):
+                yield from zipEntries(dataDir, name, storeSymlinks, entry.path)
+
+def zipStreamEntries(reader,
+                     dataDir,
+                     name,
+                     spoolSize,
+                     storeSymlinks=False,
+                     memorySize=1024 * 1024):
+    with tarfile.open(fileobj=reader, mode='r|') as tar:
+        for member in tar:
+            if member.name == name:
+                continue
+
+            zinfo = zipfile.ZipInfo(member.name, zipDateTime(member.mtime))
+
+            if member.isdir():
+                zinfo.filename += '/'
+                zinfo.external_attr = (stat.S_IFDIR | member.mode) << 16 | 0x10
+
+                yield zinfo, b''
+            elif member.issym():
+                if storeSymlinks:
+                    yield zipSymlinkEntry(member.name,
+                                          member.linkname,
+                                          member.mtime)
+                else:
+                    yield zipFileEntry(os.path.join(dataDir,
+                                                    os.path.relpath(member.name,
+                                                                    name)),
+                                       member.name)
+            elif member.islnk():
+                # Zip doesn't support hardlinks, read the file again.
+                path = os.path.join(dataDir, os.path.relpath(member.name, name))
+                zinfo.external_attr = (stat.S_IFREG | member.mode) << 16
+                zinfo.file_size = os.path.getsize(path)
+
+                yield zinfo, path
+            elif member.isreg():
+                zinfo.external_attr = (stat.S_IFREG | member.mode) << 16
+                zinfo.file_size = member.size
+
+                if member.size <= memorySize:
+                    yield zinfo, io.BytesIO(tar.extractfile(member).read())
+
+                    continue
+
+                spool = tempfile.SpooledTemporaryFile(max_size=spoolSize)
+                shutil.copyfileobj(tar.extractfile(member), spool, 1024 * 1024)
+                spool.seek(0)
+
+                yield zinfo, spool
+
+def readZipEntry(fsrc, spool, compressor, chunkSize=1024 * 1024):
+    crc = 0
+    size = 0
+
+    while True:
+        chunk = fsrc.read(chunkSize)
+
+        if not chunk:
+            break
+
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        spool.write(compressor.compress(chunk) if compressor else chunk)
+
+    if compressor:
+        spool.write(compressor.flush())
+
+    return crc, size
+
+def deflateZipEntry(zinfo, data, level, store, classifier=None):
+    # Same as compressZipEntry, for the data already in memory.
+    zinfo.CRC = zlib.crc32(data)
+    zinfo.file_size = len(data)
+
+    if not store \
+        and classifier \
+        and classifier.isWorthChecking(len(data)) \
+        and not classifier.isCompressible(data[: classifier.sampleSize]):
+        recordStored('deflate', len(data), 1)
+        store = True
+
+    if not store:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        startTime = time.perf_counter()
+        compressed = compressor.compress(data) + compressor.flush()
+        recordCompressed('deflate', len(data), time.perf_counter() - startTime)
+
+        if len(compressed) < len(data):
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            zinfo.compress_size = len(compressed)
+
+            return zinfo, compressed
+
+    zinfo.compress_type = zipfile.ZIP_STORED
+    zinfo.compress_size = len(data)
+
+    return zinfo, data
+
+def compressZipEntry(zinfo,
+                     source,
+                     level,
+                     store,
+                     spoolSize,
+                     classifier=None,
+                     memorySize=1024 * 1024):
+    if isinstance(source, bytes):
+        zinfo.compress_type = zipfile.ZIP_STORED
+        zinfo.CRC = zlib.crc32(source)
+        zinfo.file_size = len(source)
+        zinfo.compress_size = len(source)
+
+        return zinfo, source
+
+    # Small files are compressed in memory, without spooling them.
+    if zinfo.file_size <= memorySize:
+        with open(source, 'rb') if isinstance(source, str) else source as f:
+            data = f.read()
+
+        return deflateZipEntry(zinfo, data, level, store, classifier)
+
+    spool = tempfile.SpooledTemporaryFile(max_size=spoolSize)
+
+    try:
+        with open(source, 'rb') if isinstance(source, str) else source as f:
+            classified = False
+            reader = f
+
+            if not store \
+                and classifier \
+                and classifier.isWorthChecking(zinfo.file_size):
+                # The sample is the start of the data read below.
+                sample = f.read(classifier.sampleSize)
+                reader = PrefixedReader(sample, f)
+
+                if not classifier.isCompressible(sample):
+                    store = True
+                    classified = True
+
+            if not store:
+                compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+                startTime = time.perf_counter()
+                zinfo.CRC, zinfo.file_size = readZipEntry(reader,
+                                                          spool,
+                                                          compressor)
+                recordCompressed('deflate',
+                                 zinfo.file_size,
+                                 time.perf_counter() - startTime)
+                zinfo.compress_size = spool.tell()
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+
+            # Store the file if it can't be compressed.
+            if store or zinfo.compress_size >= zinfo.file_size:
+                if not store:
+                    f.seek(0)
+                    reader = f
+
+                spool.seek(0)
+                spool.truncate()
+                zinfo.CRC, zinfo.file_size = readZipEntry(reader, spool, None)
+                zinfo.compress_size = spool.tell()
+                zinfo.compress_type = zipfile.ZIP_STORED
+
+                if classified:
+                    recordStored('deflate', zinfo.file_size, 1)
+    except:
+        spool.close()
+
+        raise
+
+    return zinfo, spool
+
+# Values from these limits on are written in the ZIP64 records.
+ZIP_LIMIT = 0xffffffff
+ZIP_COUNT_LIMIT = 0xffff
+
+def zip32(value, limit, mark=0xffffffff):
+    return mark if value >= limit else value
+
+def zipDosTime(dateTime):
+    year, month, day, hour, minute, second = dateTime[0: 6]
+
+    return (hour << 11 | minute << 5 | second // 2,
+            (year - 1980) << 9 | month << 5 | day)
+
+class ZipWriter:
+    # Appends the entries with their sizes and CRC already known, and writes
+    # the central directory when closed. ZIP64 records are used only for the
+    # values that don't fit in the classic ones.
+    def __init__(self, fileobj):
+        super().__init__()
+        self.fileobj = fileobj
+        self.records = []
+        self.position = 0
+
+    def write(self, data):
+        self.fileobj.write(data)
+        self.position += len(data)
+
+    @staticmethod
+    def encodeName(zinfo):
+        try:
+            return zinfo.filename.encode('ascii'), 0
+        except UnicodeEncodeError:
+            # Language encoding flag, the name is UTF-8.
+            return zinfo.filename.encode('utf-8'), 0x800
+
+    def append(self, zinfo, data):
+        offset = self.position
+        fileName, flags = self.encodeName(zinfo)
+        dosTime, dosDate = zipDosTime(zinfo.date_time)
+        zip64 = zinfo.file_size >= ZIP_LIMIT \
+                or zinfo.compress_size >= ZIP_LIMIT
+        extra = b''
+
+        if zip64:
+            extra = struct.pack('<HHQQ',
+                                1,
+                                16,
+                                zinfo.file_size,
+                                zinfo.compress_size)
+            compressSize = 0xffffffff
+            fileSize = 0xffffffff
+        else:
+            compressSize = zinfo.compress_size
+            fileSize = zinfo.file_size
+
+        version = 45 if zip64 else 20
+        self.write(struct.pack('<IHHHHHIIIHH',
+                               0x04034b50,
+                               version,
+                               flags,
+                               zinfo.compress_type,
+                               dosTime,
+                               dosDate,
+                               zinfo.CRC,
+                               compressSize,
+                               fileSize,
+                               len(fileName),
+                               len(extra))
+                   + fileName
+                   + extra)
+
+        if isinstance(data, bytes):
+            self.write(data)
+        else:
+            with data:
+                data.seek(0)
+
+                while True:
+                    chunk = data.read(1024 * 1024)
+
+                    if not chunk:
+                        break
+
+                    self.write(chunk)
+
+        self.records.append((zinfo, offset))
+
+    def centralHeader(self, zinfo, offset):
+        fileName, flags = self.encodeName(zinfo)
+        dosTime, dosDate = zipDosTime(zinfo.date_time)
+        values = [zinfo.file_size, zinfo.compress_size, offset]
+        zip64Values = [value for value in values if value >= ZIP_LIMIT]
+        fileSize, compressSize, offset = [zip32(value, ZIP_LIMIT)
+                                          for value in values]
+        extra = b''
+
+        if zip64Values:
+            extra = struct.pack('<HH', 1, 8 * len(zip64Values)) \
+                  + b''.join(struct.pack('<Q', value)
+                             for value in zip64Values)
+
+        version = 45 if zip64Values else 20
+
+        return struct.pack('<IHHHHHHIIIHHHHHII',
+                           0x02014b50,
+                           zinfo.create_system << 8 | version,
+                           version,
+                           flags,
+                           zinfo.compress_type,
+                           dosTime,
+                           dosDate,
+                           zinfo.CRC,
+                           compressSize,
+                           fileSize,
+                           len(fileName),
+                           len(extra),
+                           0,
+                           0,
+                           0,
+                           zinfo.external_attr,
+                           offset) \
+               + fileName \
+               + extra
+
+    def close(self):
+        centralDirOffset = self.position
+
+        for zinfo, offset in self.records:
+            self.write(self.centralHeader(zinfo, offset))
+
+        centralDirSize = self.position - centralDirOffset
+        count = len(self.records)
+
+        if count >= ZIP_COUNT_LIMIT \
+            or centralDirSize >= ZIP_LIMIT \
+            or centralDirOffset >= ZIP_LIMIT:
+            zip64EndOffset = self.position
+            self.write(struct.pack('<IQHHIIQQQQ',
+                                   0x06064b50,
+                                   44,
+                                   45,
+                                   45,
+                                   0,
+                                   0,
+                                   count,
+                                   count,
+                                   centralDirSize,
+                                   centralDirOffset))
+            self.write(struct.pack('<IIQI', 0x07064b50, 0, zip64EndOffset, 1))
+
+        self.write(struct.pack('<IHHHHIIH',
+                               0x06054b50,
+                               0,
+                               0,
+                               zip32(count, ZIP_COUNT_LIMIT, 0xffff),
+                               zip32(count, ZIP_COUNT_LIMIT, 0xffff),
+                               zip32(centralDirSize, ZIP_LIMIT),
+                               zip32(centralDirOffset, ZIP_LIMIT),
+                               0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+
+def writeZip(outPackage,
+             dataDir,
+             name,
+             level=6,
+             storeOnly=False,
+             storeExtensions=ZIP_STORE_EXTENSIONS,
+             threads=0,
+             spoolSize=16 * 1024 * 1024,
+             reader=None,
+             classifier=None,
+             storeSymlinks=False,
+             memorySize=1024 * 1024,
+             maxPendingSize=64 * 1024 * 1024):
+    storeExtensions = {ext.lower() for ext in storeExtensions}
+
+    def compress(item):
+        zinfo, source = item
+        store = storeOnly \
+                or os.path.splitext(zinfo.filename)[1].lower() in storeExtensions
+
+        return compressZipEntry(zinfo,
+                                source,
+                                level,
+                                store,
+                                spoolSize,
+                                classifier,
+                                memorySize)
+
+    def entrySize(item):
+        zinfo, _ = item
+
+        return zinfo.file_size
+
+    if reader:
+        entries = zipStreamEntries(reader,
+                                   dataDir,
+                                   name,
+                                   spoolSize,
+                                   storeSymlinks,
+                                   memorySize)
+    else:
+        entries = zipEntries(dataDir, name, storeSymlinks)
+
+    # The entries are deflated in parallel, and then appended to the file
+    # in order, with the sizes and CRC already known. The size of the
+    # entries being compressed is bounded, not only their number.
+    with open(outPackage, 'wb') as f:
+        with ZipWriter(f) as writer:
+            for zinfo, data in DTUtils.orderedParallelMap(compress,
+                                                          entries,
+                                                          threads,
+                                                          entrySize,
+                                                          maxPendingSize):
+                writer.append(zinfo, data)
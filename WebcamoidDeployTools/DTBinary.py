@@ -19,16 +19,597 @@
 #
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
+import bisect
+import collections
+import functools
 import importlib
+import json
 import os
 import re
+import sqlite3
 import subprocess # nosec
+import sys
 import threading
-import time
+import weakref
 
 from . import DTUtils
 
 
+# Most excludes match a library in any directory.
+EXCLUDE_ANY_DIR_PREFIX = '(.*/)*'
+EXTRA_EXCLUDE_LISTS = []
+EXCLUDE_MATCHERS = {}
+EXCLUDE_MATCHERS_MUTEX = threading.Lock()
+
+SCAN_INDEXES = weakref.WeakSet()
+SCAN_INDEXES_MUTEX = threading.Lock()
+
+def addExcludeList(excludeList):
+    if not excludeList in EXTRA_EXCLUDE_LISTS:
+        EXTRA_EXCLUDE_LISTS.append(excludeList)
+
+def isSubpath(path, root):
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:
+        return False
+
+def subpaths(paths, root):
+    # Returns the paths inside of root, from a sorted list of absolute paths.
+    # The paths of a subtree are contiguous once sorted.
+    prefix = root if root.endswith(os.sep) else root + os.sep
+    start = bisect.bisect_left(paths, prefix)
+    end = bisect.bisect_left(paths, prefix[: -1] + chr(ord(os.sep) + 1))
+    found = paths[start: end]
+    i = bisect.bisect_left(paths, root)
+
+    if root != prefix and i < len(paths) and paths[i] == root:
+        found.append(root)
+
+    return found
+
+def invalidateScans(path):
+    with SCAN_INDEXES_MUTEX:
+        indexes = list(SCAN_INDEXES)
+
+    for index in indexes:
+        index.invalidate(path)
+
+def dirState(path):
+    # Adding or removing files changes the modification time of the
+    # directory.
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def scanIndex(globs):
+    if not 'scanIndex' in globs:
+        globs['scanIndex'] = ScanIndex()
+
+    return globs['scanIndex']
+
+class ExcludeMatcher:
+    def __init__(self, excludes, ignoreCase=False, memoSize=65536):
+        super().__init__()
+        flags = re.IGNORECASE if ignoreCase else 0
+        anyDirExcludes = []
+        fullPathExcludes = []
+
+        for exclude in excludes:
+            if exclude.startswith(EXCLUDE_ANY_DIR_PREFIX):
+                anyDirExcludes.append(exclude[len(EXCLUDE_ANY_DIR_PREFIX):])
+            else:
+                fullPathExcludes.append(exclude)
+
+        self.anyDirRegex = self.compile(anyDirExcludes, flags)
+        self.fullPathRegex = self.compile(fullPathExcludes, flags)
+        self.isExcluded = functools.lru_cache(maxsize=memoSize)(self.match)
+
+    @staticmethod
+    def compile(excludes, flags):
+        if len(excludes) < 1:
+            return None
+
+        return re.compile('|'.join(['(?:{})'.format(exclude) for exclude in excludes]),
+                          flags)
+
+    def match(self, path):
+        if self.fullPathRegex and self.fullPathRegex.fullmatch(path):
+            return True
+
+        if not self.anyDirRegex:
+            return False
+
+        # '(.*/)*' can only consume the path up to one of its slashes, so try
+        # the rest of the pattern from the start and after every slash.
+        i = 0
+
+        while True:
+            if self.anyDirRegex.fullmatch(path, i):
+                return True
+
+            i = path.find('/', i) + 1
+
+            if i < 1:
+                return False
+
+class BinaryCacheStore:
+    def __init__(self, path, useHash=False):
+        super().__init__()
+        self.path = path
+        self.useHash = useHash
+        self.mutex = threading.Lock()
+        self.hashes = {}
+        self.pending = 0
+        cacheDir = os.path.dirname(path)
+
+        if cacheDir != '' and not os.path.exists(cacheDir):
+            os.makedirs(cacheDir)
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS binaries ('
+                        'kind TEXT NOT NULL, '
+                        'context TEXT NOT NULL, '
+                        'path TEXT NOT NULL, '
+                        'size INTEGER NOT NULL, '
+                        'mtime INTEGER NOT NULL, '
+                        'hash TEXT NOT NULL, '
+                        'value TEXT NOT NULL, '
+                        'PRIMARY KEY (kind, context, path))')
+        self.db.commit()
+
+    @staticmethod
+    def encode(value):
+        def encodeSet(obj):
+            if isinstance(obj, set):
+                return {'__set__': sorted(obj)}
+
+            raise TypeError('{} is not serializable'.format(type(obj)))
+
+        return json.dumps(value, default=encodeSet)
+
+    @staticmethod
+    def decode(value):
+        def decodeSet(obj):
+            if '__set__' in obj:
+                return set(obj['__set__'])
+
+            return obj
+
+        return json.loads(value, object_hook=decodeSet)
+
+    def fileHash(self, binary, fileKey):
+        if not self.useHash:
+            return ''
+
+        with self.mutex:
+            if fileKey in self.hashes:
+                return self.hashes[fileKey]
+
+        fileHash = DTUtils.sha256sum(binary)
+
+        with self.mutex:
+            self.hashes[fileKey] = fileHash
+
+        return fileHash
+
+    def load(self, kind, context, binary, fileKey):
+        with self.mutex:
+            row = self.db.execute('SELECT size, mtime, hash, value '
+                                  'FROM binaries '
+                                  'WHERE kind = ? AND context = ? AND path = ?',
+                                  (kind,
+                                   json.dumps(context),
+                                   DTUtils.realPath(binary))).fetchone()
+
+        if row is None:
+            return False, None
+
+        size, mtime, fileHash, value = row
+        _, _, stSize, stMtime = fileKey
+
+        if size != stSize:
+            return False, None
+
+        if self.useHash:
+            if fileHash != self.fileHash(binary, fileKey):
+                return False, None
+        elif mtime != stMtime:
+            return False, None
+
+        return True, self.decode(value)
+
+    def save(self, kind, context, binary, fileKey, value):
+        _, _, stSize, stMtime = fileKey
+        fileHash = self.fileHash(binary, fileKey)
+
+        try:
+            value = self.encode(value)
+        except (TypeError, ValueError):
+            return
+
+        with self.mutex:
+            self.db.execute('INSERT OR REPLACE INTO binaries '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (kind,
+                             json.dumps(context),
+                             DTUtils.realPath(binary),
+                             stSize,
+                             stMtime,
+                             fileHash,
+                             value))
+            self.pending += 1
+
+            if self.pending >= 256:
+                self.db.commit()
+                self.pending = 0
+
+    def close(self):
+        with self.mutex:
+            self.db.commit()
+            self.db.close()
+
+class BinaryCache:
+    def __init__(self, maxSize=16384):
+        super().__init__()
+        self.maxSize = maxSize
+        self.entries = collections.OrderedDict()
+        self.mutex = threading.Lock()
+        self.store = None
+        self.hits = 0
+        self.storeHits = 0
+        self.misses = 0
+
+    def key(self, binary):
+        try:
+            st = os.stat(binary)
+        except OSError:
+            return None
+
+        # The device and inode already identify the real file behind any
+        # symlink, and the size and modification time change whenever the
+        # binary is replaced, stripped or patched.
+        return (st.st_dev,
+                st.st_ino,
+                st.st_size,
+                st.st_mtime_ns)
+
+    def openStore(self, cacheDir, useHash=False):
+        self.closeStore()
+        self.store = BinaryCacheStore(os.path.join(cacheDir, 'binaries.sqlite'),
+                                      useHash)
+
+    def closeStore(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def memoize(self, function, binary, context=(), validate=None, kind=None):
+        fileKey = self.key(binary)
+
+        if fileKey is None:
+            return function(binary)
+
+        if kind is None:
+            kind = '{}.{}'.format(function.__module__, function.__name__)
+
+        key = (kind, context, fileKey)
+
+        with self.mutex:
+            if key in self.entries \
+                and (validate is None or validate(self.entries[key])):
+                self.entries.move_to_end(key)
+                self.hits += 1
+
+                return self.entries[key]
+
+            self.misses += 1
+
+        found = False
+        value = None
+
+        if self.store is not None:
+            found, value = self.store.load(kind, context, binary, fileKey)
+
+            if found and validate is not None and not validate(value):
+                found = False
+
+        if found:
+            with self.mutex:
+                self.storeHits += 1
+        else:
+            value = function(binary)
+
+            if self.store is not None:
+                self.store.save(kind, context, binary, fileKey, value)
+
+        with self.mutex:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+
+        return value
+
+    def stats(self):
+        with self.mutex:
+            return {'hits': self.hits,
+                    'storeHits': self.storeHits,
+                    'misses': self.misses,
+                    'size': len(self.entries)}
+
+    def clear(self):
+        with self.mutex:
+            self.entries.clear()
+            self.hits = 0
+            self.storeHits = 0
+            self.misses = 0
+
+# Shared by every BinaryTools instance and every binary format backend.
+binaryCache = BinaryCache()
+
+class DependencyGraph:
+    def __init__(self, tools):
+        super().__init__()
+        self.tools = tools
+        self.edges = {}
+        self.searched = {}
+        self.dirStates = {}
+        self.components = {}
+        self.closures = []
+        self.mutex = threading.Lock()
+
+    def successors(self, binary):
+        if not binary in self.edges:
+            resolved = self.tools.resolveDependencies(binary, self.dirStates)
+            self.searched[binary] = resolved['searched']
+            deps = self.tools.filterDependencies(resolved['libs'])
+            self.edges[binary] = sorted(set(deps) - {binary})
+
+        return self.edges[binary]
+
+    def forgetChanged(self):
+        # Forget the dependencies of the binaries resolved before files were
+        # added or removed from the directories where they were looked for.
+        states = {}
+        changed = set()
+
+        with self.mutex:
+            for binary, searched in self.searched.items():
+                for path, state in searched:
+                    if not path in states:
+                        states[path] = dirState(path)
+
+                    if states[path] != state:
+                        changed.add(binary)
+
+                        break
+
+            for binary in changed:
+                del self.edges[binary]
+                del self.searched[binary]
+
+            # The states just taken are the ones of the following scan.
+            self.dirStates = states
+
+            # The closures are solved again from the known edges.
+            if len(changed) > 0:
+                self.components = {}
+                self.closures = []
+
+        return changed
+
+    def closure(self, binary):
+        with self.mutex:
+            if not binary in self.components:
+                self.solveComponents(binary)
+
+            return self.closures[self.components[binary]]
+
+    # Tarjan's algorithm, the strongly connected components are found in
+    # reverse topological order, so the closures of every component reachable
+    # from the current one are already known when it is completed.
+    def solveComponents(self, root):
+        index = {root: 0}
+        lowlink = {root: 0}
+        stack = [root]
+        onStack = {root}
+        callStack = [(root, iter(self.successors(root)))]
+
+        while len(callStack) > 0:
+            node, children = callStack[-1]
+            descended = False
+
+            for child in children:
+                if child in self.components:
+                    continue
+
+                if not child in index:
+                    index[child] = len(index)
+                    lowlink[child] = index[child]
+                    stack.append(child)
+                    onStack.add(child)
+                    callStack.append((child, iter(self.successors(child))))
+                    descended = True
+
+                    break
+
+                if child in onStack:
+                    lowlink[node] = min(lowlink[node], index[child])
+
+            if descended:
+                continue
+
+            callStack.pop()
+
+            if len(callStack) > 0:
+                parent = callStack[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+            if lowlink[node] != index[node]:
+                continue
+
+            members = []
+
+            while True:
+                member = stack.pop()
+                onStack.discard(member)
+                members.append(member)
+
+                if member == node:
+                    break
+
+            component = len(self.closures)
+
+            for member in members:
+                self.components[member] = component
+
+            # The members of a cycle depend on each other.
+            closure = set(members) if len(members) > 1 else set()
+
+            for member in members:
+                for child in self.successors(member):
+                    childComponent = self.components[child]
+
+                    if childComponent != component:
+                        closure.add(child)
+                        closure.update(self.closures[childComponent])
+
+            self.closures.append(frozenset(closure))
+
+class ScanIndex:
+    # Incremental dependency solver for the trees being deployed. It
+    # remembers the dependencies of every binary found in a tree, and the
+    # following scans only resolve the binaries added to the subtrees written
+    # since then, against the dependency graph already known.
+    def __init__(self):
+        super().__init__()
+        self.mutex = threading.Lock()
+        self.trees = {}
+        self.scans = 0
+        self.rescans = 0
+        self.resolved = 0
+
+        with SCAN_INDEXES_MUTEX:
+            SCAN_INDEXES.add(self)
+
+    def invalidate(self, path):
+        path = os.path.abspath(path)
+
+        with self.mutex:
+            for (root, _), tree in self.trees.items():
+                if isSubpath(path, root):
+                    tree['dirty'].add(path)
+                elif isSubpath(root, path):
+                    tree['dirty'].add(root)
+
+    def tree(self, tools, path):
+        root = os.path.abspath(path)
+        treeKey = (root, (tools.hostPlatform,) + tools.searchContext)
+
+        with self.mutex:
+            if not treeKey in self.trees:
+                self.trees[treeKey] = {'binaries': {},
+                                       'dirty': {root},
+                                       'graph': None,
+                                       'delivered': {},
+                                       'lock': threading.Lock()}
+
+            return self.trees[treeKey]
+
+    def dependencyGraph(self, tools, path):
+        tree = self.tree(tools, path)
+
+        with tree['lock']:
+            if tree['graph'] is None:
+                tree['graph'] = tools.dependencyGraph()
+
+            return tree['graph']
+
+    def scan(self, tools, path):
+        tree = self.tree(tools, path)
+
+        # Only one scan of the same tree at a time.
+        with tree['lock']:
+            with self.mutex:
+                dirty = tree['dirty']
+                tree['dirty'] = set()
+                binaries = dict(tree['binaries'])
+                self.scans += 1
+
+                if len(dirty) > 0:
+                    self.rescans += 1
+
+            graph = tree['graph']
+            unsolved = set()
+
+            # The known dependencies are not valid anymore if a binary was
+            # modified or removed in place.
+            for binary, (key, _) in list(binaries.items()):
+                if binaryCache.key(binary) != key:
+                    graph = None
+
+                    break
+
+            if graph is None:
+                graph = tools.dependencyGraph()
+                tree['graph'] = graph
+                unsolved = {binary for binary in binaries
+                            if os.path.exists(binary)}
+                binaries = {}
+            elif len(graph.forgetChanged()) > 0:
+                # Any known binary may depend on the forgotten ones.
+                unsolved = {binary for binary in binaries
+                            if os.path.exists(binary)}
+
+            # Forget and look again at the binaries of the written subtrees.
+            knownBinaries = sorted(binaries)
+            unsolvedBinaries = sorted(unsolved)
+
+            for dirtyPath in dirty:
+                for binary in subpaths(knownBinaries, dirtyPath):
+                    binaries.pop(binary, None)
+
+                unsolved.difference_update(subpaths(unsolvedBinaries, dirtyPath))
+
+                if os.path.isdir(dirtyPath):
+                    unsolved.update(tools.find(dirtyPath))
+                elif os.path.isfile(dirtyPath) \
+                    and not os.path.islink(dirtyPath) \
+                    and tools.isValid(dirtyPath):
+                    unsolved.add(dirtyPath)
+
+            for binary in unsolved:
+                binaries[binary] = (binaryCache.key(binary),
+                                    frozenset(tools.allDependencies(binary,
+                                                                    graph)))
+
+            with self.mutex:
+                tree['binaries'] = binaries
+                self.resolved += len(unsolved)
+
+        deps = set()
+
+        for _, binaryDeps in binaries.values():
+            deps.update(binaryDeps)
+
+        return sorted(deps)
+
+    def delta(self, tools, path, consumer):
+        # Returns all the dependencies of the tree, and the ones that were not
+        # returned before to the same consumer.
+        deps = self.scan(tools, path)
+        tree = self.tree(tools, path)
+
+        with self.mutex:
+            delivered = tree['delivered'].setdefault(consumer, set())
+            newDeps = [dep for dep in deps if not dep in delivered]
+            delivered.update(newDeps)
+
+        return deps, newDeps
+
 class BinaryTools:
     def __init__(self,
                  hostPlatform,
@@ -50,7 +631,9 @@ class BinaryTools:
             self.solver = importlib.import_module('WebcamoidDeployTools.DTBinaryElf')
 
         self.solver.init(targetPlatform, targetArch, sysLibDir)
+        self.searchContext = (targetPlatform, targetArch, tuple(sysLibDir))
         self.excludes = []
+        self.excludeMatcher = None
         self.readExcludes()
 
     def name(self, binary):
@@ -72,43 +655,93 @@ class BinaryTools:
         return binaries
 
     def dump(self, binary):
-        return self.solver.dump(binary)
+        return binaryCache.memoize(self.solver.dump, binary)
+
+    def dependencies(self, binary):
+        return self.resolveDependencies(binary)['libs']
+
+    def resolveDependencies(self, binary, dirStates=None):
+        # The resolved paths depend on where the binary is located, on the
+        # search paths, and on the libraries present in the search
+        # directories. The edges are kept together with the state of those
+        # directories, and resolved again when any of them changed.
+        context = (os.path.abspath(binary),) + self.searchContext
+        searched = self.searchState(binary, dirStates)
+
+        def solve(binary):
+            return {'searched': searched,
+                    'libs': self.solver.dependencies(binary)}
+
+        # Resolved libraries may have been removed since they were stored.
+        def validate(resolved):
+            return resolved['searched'] == searched \
+                   and all(os.path.exists(lib) for lib in resolved['libs'])
+
+        return binaryCache.memoize(solve,
+                                   binary,
+                                   context,
+                                   validate,
+                                   '{}.dependencies'.format(__name__))
+
+    def searchDirs(self, binary):
+        return self.solver.searchDirs(binary)
+
+    def searchState(self, binary, dirStates=None):
+        # Take the state of the directories before looking at them. The
+        # binaries of the same scan share most of the search directories,
+        # every directory is looked at only once per scan.
+        if dirStates is None:
+            dirStates = {}
+
+        searchDirs = set(self.searchDirs(binary))
+
+        for path in searchDirs:
+            if not path in dirStates:
+                dirStates[path] = dirState(path)
+
+        return sorted([path, dirStates[path]] for path in searchDirs)
 
     def isExecutable(self, binary):
-        info = self.solver.dump(binary)
+        info = self.dump(binary)
 
         if 'type' in info and info['type'] == 'executable':
             return True
 
         return False
 
-    def allDependencies(self, binary):
-        deps = self.filterDependencies(self.solver.dependencies(binary))
-        solved = set()
+    def dependencyGraph(self):
+        return DependencyGraph(self)
 
-        while len(deps) > 0:
-            dep = deps.pop()
+    def allDependencies(self, binary, graph=None):
+        if graph is None:
+            graph = self.dependencyGraph()
 
-            for binDep in self.filterDependencies(self.solver.dependencies(dep)):
-                if binDep != dep and not binDep in solved:
-                    deps.append(binDep)
+        if self.hostPlatform != 'mac':
+            return set(graph.closure(binary))
 
-            if self.hostPlatform == 'mac':
-                i = dep.rfind('.framework/')
+        solved = set()
+
+        for dep in graph.closure(binary):
+            i = dep.rfind('.framework/')
 
-                if i >= 0:
-                    dep = dep[: i] + '.framework'
+            if i >= 0:
+                dep = dep[: i] + '.framework'
 
             solved.add(dep)
 
         return solved
 
-    def scanDependencies(self, path):
+    def scanDependencies(self, path, graph=None, index=None):
+        if graph is None:
+            graph = self.dependencyGraph()
+
+        if index:
+            return index.scan(self, path)
+
         deps = set()
 
         for binPath in self.find(path):
-            for dep in self.allDependencies(binPath):
-                deps.add(dep)
+            deps.update(self.allDependencies(binPath, graph))
 
         return sorted(deps)
 
@@ -116,35 +749,101 @@ class BinaryTools:
         return self.solver.guess(mainExecutable, dependency)
 
     def strip(self, binary):
+        return self.stripBatch([binary])[binary]
+
+    def stripBatch(self, binaries):
         if self.stripBin == '':
-            return
+            return {binary: ('skipped', 'strip not found') for binary in binaries}
 
-        process = subprocess.Popen([self.stripBin, binary], # nosec
+        process = subprocess.Popen([self.stripBin] + binaries, # nosec
                                    stdout=subprocess.PIPE,
                                    stderr=subprocess.PIPE)
-        process.communicate()
+        _, stderr = process.communicate()
+
+        if process.returncode == 0:
+            return {binary: ('stripped', '') for binary in binaries}
+
+        if len(binaries) == 1:
+            return {binaries[0]: ('failed',
+                                  stderr.decode(sys.getdefaultencoding(),
+                                                errors='replace').strip())}
+
+        # Strip the files one by one to know which ones failed.
+        results = {}
+
+        for binary in binaries:
+            results.update(self.stripBatch([binary]))
+
+        return results
+
+    def stripChunks(self, binaries, maxArgsSize=32000):
+        # Keep every worker busy, and the command line below the limits of
+        # the system.
+        nthreads = DTUtils.numThreads()
+        maxFiles = max(1, (len(binaries) + nthreads - 1) // nthreads)
+        chunks = []
+        chunk = []
+        chunkSize = len(self.stripBin)
+
+        for binary in binaries:
+            if len(chunk) > 0 \
+                and (len(chunk) >= maxFiles
+                     or chunkSize + len(binary) + 1 > maxArgsSize):
+                chunks.append(chunk)
+                chunk = []
+                chunkSize = len(self.stripBin)
+
+            chunk.append(binary)
+            chunkSize += len(binary) + 1
+
+        if len(chunk) > 0:
+            chunks.append(chunk)
+
+        return chunks
 
     def stripSymbols(self, path):
-        threads = []
+        if self.stripBin == '':
+            return {}
 
-        for binary in self.find(path):
-            thread = threading.Thread(target=self.strip, args=(binary,))
-            threads.append(thread)
+        results = {}
+        binaries = []
 
-            while threading.active_count() >= DTUtils.numThreads():
-                time.sleep(0.25)
+        for binary in self.find(path):
+            if self.solver.hasSymbols(binary):
+                binaries.append(binary)
+            else:
+                results[binary] = ('skipped', '')
 
-            thread.start()
+        for chunk, chunkResults, error in DTUtils.parallelMap(self.stripBatch,
+                                                             self.stripChunks(binaries)):
+            if error is None:
+                results.update(chunkResults)
+            else:
+                results.update({binary: ('failed', str(error)) for binary in chunk})
 
-        for thread in threads:
-            thread.join()
+        return results
 
     def readExcludes(self):
         curDir = os.path.dirname(DTUtils.realPath(__file__))
-        self.readExcludeList(os.path.join(curDir, 'exclude', self.targetPlatform + '.txt'))
+        excludeLists = [os.path.join(curDir, 'exclude', self.targetPlatform + '.txt')] \
+                     + EXTRA_EXCLUDE_LISTS
+        key = (self.targetPlatform, tuple(excludeLists))
+
+        # Compile the excludes just once for every BinaryTools instance.
+        with EXCLUDE_MATCHERS_MUTEX:
+            if not key in EXCLUDE_MATCHERS:
+                excludes = []
+
+                for excludeList in excludeLists:
+                    excludes += self.readExcludeList(excludeList)
+
+                matcher = ExcludeMatcher(excludes, self.targetPlatform == 'windows')
+                EXCLUDE_MATCHERS[key] = (excludes, matcher)
+
+            self.excludes, self.excludeMatcher = EXCLUDE_MATCHERS[key]
 
     def readExcludeList(self, excludeList):
-        self.excludes = []
+        excludes = []
 
         if os.path.exists(excludeList):
             with open(excludeList) as f:
@@ -160,18 +859,15 @@ class BinaryTools:
                         line = line.strip()
 
                         if len(line) > 0:
-                            self.excludes.append(line)
+                            excludes.append(line)
 
-    def isExcluded(self, path):
-        for exclude in self.excludes:
-            if self.targetPlatform == 'windows':
-                path = path.lower().replace('\\', '/')
-                exclude = exclude.lower()
+        return excludes
 
-            if re.fullmatch(exclude, path):
-                return True
+    def isExcluded(self, path):
+        if self.targetPlatform == 'windows':
+            path = path.replace('\\', '/')
 
-        return False
+        return self.excludeMatcher.isExcluded(path)
 
     def filterDependencies(self, deps):
         outDeps = []
@@ -20,16 +20,25 @@
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
 import fnmatch
+import mmap
 import os
 import re
 import struct
 import sys
+import threading
+import time
 
 from . import DTBinary
 
 
 LD_LIBRARY_PATH = []
 LIBS_SEARCH_PATHS = []
+LIBS_DIR_INDEX = {}
+LIBS_DIR_INDEX_MUTEX = threading.Lock()
+LDCONF_PATHS = None
+LDSO_CACHE = None
+LDSO_CACHE_MUTEX = threading.Lock()
+USE_LDSO_CACHE = False
 ANDROID_ARCH_MAP = [('arm64-v8a'  , 'aarch64', 'aarch64-linux-android'),
                     ('armeabi-v7a', 'arm'    , 'arm-linux-androideabi'),
                     ('x86'        , 'i686'   , 'i686-linux-android'   ),
@@ -90,11 +99,101 @@ def readLdconf(ldconf='/etc/ld.so.conf'):
 
     return libpaths
 
+# https://sourceware.org/git/?p=glibc.git;a=blob;f=sysdeps/generic/dl-cache.h
+def readLdsoCache(ldsocache='/etc/ld.so.cache'):
+    OLD_MAGIC = b'ld.so-1.7.0'
+    NEW_MAGIC = b'glibc-ld.so.cache1.1'
+
+    # Header and entry sizes of both formats.
+    OLD_HEADER_SIZE = 16
+    OLD_ENTRY_SIZE = 12
+    NEW_HEADER_SIZE = 48
+    NEW_ENTRY_SIZE = 24
+
+    # Endianness flags of the new format.
+    ENDIAN_LITTLE = 2
+    ENDIAN_BIG = 3
+
+    libs = {}
+
+    try:
+        with open(ldsocache, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return libs
+
+    newCache = -1
+
+    if data.startswith(OLD_MAGIC):
+        nlibs = struct.unpack_from('=I', data, 12)[0]
+        stringsStart = OLD_HEADER_SIZE + nlibs * OLD_ENTRY_SIZE
+
+        # Caches written by old glibc versions may append a new format cache
+        # after the entries of the old one, prefer it when available.
+        newStart = (stringsStart + 7) & ~7
+
+        if data.startswith(NEW_MAGIC, newStart):
+            newCache = newStart
+        else:
+            for i in range(nlibs):
+                flags, key, value = \
+                    struct.unpack_from('=iII',
+                                       data,
+                                       OLD_HEADER_SIZE + i * OLD_ENTRY_SIZE)
+                soname = readString(data, stringsStart + key)
+                path = readString(data, stringsStart + value)
+                libs.setdefault(soname.decode(sys.getdefaultencoding()), []) \
+                    .append((path.decode(sys.getdefaultencoding()), flags, 0))
+    elif data.startswith(NEW_MAGIC):
+        newCache = 0
+
+    if newCache >= 0:
+        nlibs = struct.unpack_from('=I', data, newCache + 20)[0]
+        endianFlags = data[newCache + 28] & 0x3
+
+        if endianFlags == ENDIAN_LITTLE:
+            endian = '<'
+        elif endianFlags == ENDIAN_BIG:
+            endian = '>'
+        else:
+            endian = '='
+
+        for i in range(nlibs):
+            # Strings offsets are relative to the start of the new cache.
+            flags, key, value, _, hwcap = \
+                struct.unpack_from(endian + 'iIIIQ',
+                                   data,
+                                   newCache
+                                   + NEW_HEADER_SIZE
+                                   + i * NEW_ENTRY_SIZE)
+            soname = readString(data, newCache + key)
+            path = readString(data, newCache + value)
+            libs.setdefault(soname.decode(sys.getdefaultencoding()), []) \
+                .append((path.decode(sys.getdefaultencoding()), flags, hwcap))
+
+    return libs
+
+def ldsoCache():
+    global LDSO_CACHE
+
+    # The cache is parsed only once per process.
+    with LDSO_CACHE_MUTEX:
+        if LDSO_CACHE is None:
+            try:
+                LDSO_CACHE = readLdsoCache()
+            except (IndexError, struct.error):
+                LDSO_CACHE = {}
+
+        return LDSO_CACHE
+
 def init(targetPlatform, targetArch, sysLibDir):
     global LD_LIBRARY_PATH
     global LIBS_SEARCH_PATHS
+    global LDCONF_PATHS
+    global USE_LDSO_CACHE
 
     LD_LIBRARY_PATH = sysLibDir
+    USE_LDSO_CACHE = targetPlatform != 'android'
 
     if targetPlatform == 'android':
         androidNDK = ''
@@ -117,7 +216,10 @@ def init(targetPlatform, targetArch, sysLibDir):
                                   'lib',
                                   arch[1] + '-linux-android')]
     else:
-        LIBS_SEARCH_PATHS = readLdconf() \
+        if LDCONF_PATHS is None:
+            LDCONF_PATHS = readLdconf()
+
+        LIBS_SEARCH_PATHS = LDCONF_PATHS \
                           + ['/usr/lib',
                              '/usr/lib64',
                              '/lib',
@@ -125,51 +227,102 @@ def init(targetPlatform, targetArch, sysLibDir):
                              '/usr/local/lib',
                              '/usr/local/lib64']
 
-def libPath(lib, machine, rpaths, runpaths):
-    # man ld.so
-    searchPaths = rpaths \
-                + LD_LIBRARY_PATH \
-                + runpaths \
-                + LIBS_SEARCH_PATHS
+def libsDirIndex(libdir):
+    try:
+        mtime = os.stat(libdir).st_mtime_ns
+    except OSError:
+        return {}
 
-    for libdir in searchPaths:
-        path = os.path.join(libdir, lib)
+    # Adding or removing files changes the modification time of the
+    # directory, so the index is rebuilt when libraries are copied into it.
+    with LIBS_DIR_INDEX_MUTEX:
+        if libdir in LIBS_DIR_INDEX and LIBS_DIR_INDEX[libdir][0] == mtime:
+            return LIBS_DIR_INDEX[libdir][1]
 
-        if os.path.exists(path):
-            depElfInfo = dump(path)
+    index = {}
 
-            if depElfInfo:
-                if 'machine' in depElfInfo and (machine == 0 or depElfInfo['machine'] == machine):
-                    return path
-                elif 'links' in depElfInfo and len(depElfInfo['links']) > 0:
-                    return path
+    try:
+        with os.scandir(libdir) as entries:
+            for entry in entries:
+                index[entry.name] = entry.path
+    except OSError:
+        pass
 
-    return ''
+    with LIBS_DIR_INDEX_MUTEX:
+        LIBS_DIR_INDEX[libdir] = (mtime, index)
 
-def readString(f):
-    s = b''
+    return index
 
-    while True:
-        c = f.read(1)
+def machineOf(path):
+    # Read just the fields of the header required to know if the library
+    # can be loaded, instead of dumping the whole file.
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(20)
+    except OSError:
+        return None
 
-        if c == b'\x00':
-            break
+    if len(header) < 20 or header[: 4] != b'\x7fELF' or header[4] not in [1, 2]:
+        return None
 
-        s += c
+    endian = '>' if header[5] == 2 else '<'
 
-    return s
+    return struct.unpack_from(endian + 'H', header, 0x12)[0]
 
-def readNumber(f, arch):
-    if arch == '32bits':
-        return struct.unpack('I', f.read(4))[0]
+def isLibCompatible(path, machine):
+    libMachine = DTBinary.binaryCache.memoize(machineOf, path)
 
-    return struct.unpack('Q', f.read(8))[0]
+    return libMachine is not None and (machine == 0 or libMachine == machine)
 
-def readDynamicEntry(f, arch):
-    if arch == '32bits':
-        return struct.unpack('iI', f.read(8))
+def searchLibPath(lib, machine, searchPaths):
+    for libdir in searchPaths:
+        if '/' in lib:
+            path = os.path.join(libdir, lib)
+
+            if not os.path.exists(path):
+                continue
+        else:
+            path = libsDirIndex(libdir).get(lib, '')
+
+            if path == '':
+                continue
+
+        if isLibCompatible(path, machine):
+            return path
+
+    return ''
+
+def libPath(lib, machine, rpaths, runpaths):
+    # man ld.so
+    path = searchLibPath(lib,
+                         machine,
+                         rpaths + LD_LIBRARY_PATH + runpaths)
+
+    if path != '':
+        return path
+
+    # The dynamic loader checks its cache after the rpaths and the runpaths,
+    # and before the default directories.
+    if USE_LDSO_CACHE and not '/' in lib:
+        for path, _, hwcap in ldsoCache().get(lib, []):
+            # Copies optimized for some CPUs (glibc-hwcaps and the legacy
+            # hwcap subdirectories) may not load in the target machine, use
+            # the baseline copy instead.
+            if hwcap != 0:
+                continue
+
+            if isLibCompatible(path, machine):
+                return path
+
+    return searchLibPath(lib, machine, LIBS_SEARCH_PATHS)
 
-    return struct.unpack('qQ', f.read(16))
+def readString(data, offset):
+    end = data.find(b'\x00', offset)
+
+    if end < 0:
+        end = len(data)
+
+    return data[offset: end]
 
 def readRpaths(elfInfo, binDir):
     rpaths = []
@@ -195,13 +348,122 @@ def readRpaths(elfInfo, binDir):
 
 # https://refspecs.linuxfoundation.org/lsb.shtml (See Core, Generic)
 # https://en.wikipedia.org/wiki/Executable_and_Linkable_Format
+def readHeader(data):
+    # ELF file magic
+    ELFMAGIC = b'\x7fELF'
+
+    # Data structure and encoding of the file.
+    ELFCLASS32 = 1
+    ELFDATA2MSB = 2
+
+    # Read magic signature.
+    if data[: 4] != ELFMAGIC:
+        return None
+
+    # Read the data structure and the byte order of the file.
+    is32bits = data[4] == ELFCLASS32
+    endian = '>' if data[5] == ELFDATA2MSB else '<'
+
+    # Read file type and machine code.
+    fileType, machine = struct.unpack_from(endian + 'HH', data, 0x10)
+
+    # Get a pointer to the sections table, the size of each section, the
+    # number of sections, and the index of the string table that stores
+    # sections names.
+    if is32bits:
+        sectionHeaderTable = struct.unpack_from(endian + 'I', data, 0x20)[0]
+        sectionSize, nSections, shstrtabIndex = \
+            struct.unpack_from(endian + 'HHH', data, 0x2e)
+        sectionFormat = endian + 'IIIIIIIIII'
+    else:
+        sectionHeaderTable = struct.unpack_from(endian + 'Q', data, 0x28)[0]
+        sectionSize, nSections, shstrtabIndex = \
+            struct.unpack_from(endian + 'HHH', data, 0x3a)
+        sectionFormat = endian + 'IIQQQQIIQQ'
+
+    # Each section stores a pointer to its name in the string table, the
+    # type, the flags, the virtual address, the offset in file, the size, a
+    # link to other section, extra info, the alignment and the size of its
+    # entries.
+    if sectionSize == struct.calcsize(sectionFormat):
+        end = sectionHeaderTable + nSections * sectionSize
+        headers = list(struct.iter_unpack(sectionFormat,
+                                          data[sectionHeaderTable: end]))
+    else:
+        headers = [struct.unpack_from(sectionFormat,
+                                      data,
+                                      sectionHeaderTable + i * sectionSize)
+                   for i in range(nSections)]
+    shstrtabOffset = headers[shstrtabIndex][4] if shstrtabIndex < nSections else 0
+    sections = []
+
+    for i, section in enumerate(headers):
+        sections.append({'index': i,
+                         'name': section[0],
+                         'type': section[1],
+                         'offset': section[4],
+                         'size': section[5],
+                         'link': section[6],
+                         'info': section[7],
+                         'entsize': section[9]})
+
+    return {'is32bits': is32bits,
+            'endian': endian,
+            'type': fileType,
+            'machine': machine,
+            'shstrtab': shstrtabOffset,
+            'sections': sections}
+
+def sectionName(data, header, section):
+    return readString(data, header['shstrtab'] + section['name'])
+
+def findSection(data, header, name, sectionType):
+    for section in header['sections']:
+        if section['type'] == sectionType \
+            and sectionName(data, header, section) == name:
+            return section
+
+    return None
+
+def dynamicFormat(header):
+    return header['endian'] + ('iI' if header['is32bits'] else 'qQ')
+
+def readDynamicEntries(data, header, section):
+    # Dynamic section entries
+    DT_NULL = 0
+
+    entryFormat = dynamicFormat(header)
+    entrySize = struct.calcsize(entryFormat)
+    start = section['offset']
+    end = min(start + section['size'], len(data))
+    end -= (end - start) % entrySize
+    entries = []
+
+    for i, (dTag, dVal) in enumerate(struct.iter_unpack(entryFormat, data[start: end])):
+        if dTag == DT_NULL:
+            # End of dynamic sections.
+            break
+
+        entries.append((start + i * entrySize, dTag, dVal))
+
+    return entries
+
 def dump(binary):
     if not os.path.exists(binary):
         return {}
 
-    # ELF file magic
-    ELFMAGIC = b'\x7fELF'
+    try:
+        with open(binary, 'rb') as f:
+            # Map the whole file and decode it in place, this avoids issuing
+            # one read and one seek per field.
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return dumpMapped(data)
+    except (OSError, ValueError, IndexError, struct.error):
+        pass
+
+    return {}
 
+def dumpMapped(data):
     # File types.
     ET_EXEC = 2
 
@@ -210,145 +472,221 @@ def dump(binary):
     SHT_DYNAMIC = 0x6
 
     # Dynamic section entries
-    DT_NULL = 0
     DT_NEEDED = 1
     DT_RPATH = 15
     DT_RUNPATH = 0x1d
 
-    with open(binary, 'rb') as f:
-        # Read magic signature.
-        magic = f.read(4)
+    header = readHeader(data)
 
-        if magic != ELFMAGIC:
-            return {}
+    if header is None:
+        return {}
 
-        # Read the data structure of the file.
-        eiClass = '32bits' if struct.unpack('B', f.read(1))[0] == 1 else '64bits'
+    neededPtr = []
+    rpathsPtr = []
+    runpathsPtr = []
+
+    for section in header['sections']:
+        if section['type'] != SHT_DYNAMIC:
+            continue
+
+        for _, dTag, dVal in readDynamicEntries(data, header, section):
+            if dTag == DT_NEEDED:
+                # Dynamically imported libraries.
+                neededPtr.append(dVal)
+            elif dTag == DT_RPATH:
+                # RPATHs.
+                rpathsPtr.append(dVal)
+            elif dTag == DT_RUNPATH:
+                # RUNPATHs.
+                runpathsPtr.append(dVal)
+
+    # Libraries names and RUNPATHs are located in '.dynstr' table.
+    strtab = findSection(data, header, b'.dynstr', SHT_STRTAB)
+
+    def readStrings(pointers):
+        if strtab is None:
+            return set()
+
+        return {readString(data, strtab['offset'] + ptr).decode(sys.getdefaultencoding())
+                for ptr in pointers}
+
+    return {'machine': header['machine'],
+            'imports': readStrings(neededPtr),
+            'rpath': readStrings(rpathsPtr),
+            'runpath': readStrings(runpathsPtr),
+            'type': 'executable' if header['type'] == ET_EXEC else 'library'}
+
+def hasSymbols(binary):
+    # Sections
+    SHT_SYMTAB = 0x2
 
-        # Read file type.
-        f.seek(0x10, os.SEEK_SET)
-        fileType = struct.unpack('H', f.read(2))[0]
-        fileType = 'executable' if fileType == ET_EXEC else 'library'
+    try:
+        with open(binary, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                header = readHeader(data)
 
-        # Read machine code.
-        f.seek(0x12, os.SEEK_SET)
-        machine = struct.unpack('H', f.read(2))[0]
+                # Strip the file if it's not valid, it won't be worst than
+                # before.
+                if header is None:
+                    return True
 
-        # Get a pointer to the sections table.
-        sectionHeaderTable = 0
+                for section in header['sections']:
+                    name = sectionName(data, header, section)
 
-        if eiClass == '32bits':
-            f.seek(0x20, os.SEEK_SET)
-            sectionHeaderTable = readNumber(f, eiClass)
-            f.seek(0x30, os.SEEK_SET)
-        else:
-            f.seek(0x28, os.SEEK_SET)
-            sectionHeaderTable = readNumber(f, eiClass)
-            f.seek(0x3c, os.SEEK_SET)
-
-        # Read the number of sections.
-        nSections = struct.unpack('H', f.read(2))[0]
-
-        # Read the index of the string table that stores sections names.
-        shstrtabIndex = struct.unpack('H', f.read(2))[0]
-
-        # Read sections.
-        f.seek(sectionHeaderTable, os.SEEK_SET)
-        neededPtr = []
-        rpathsPtr = []
-        runpathsPtr = []
-        strtabs = []
-        shstrtab = []
-
-        for section in range(nSections):
-            sectionStart = f.tell()
-
-            # Read the a pointer to the virtual address in the string table
-            # that contains the name of this section.
-            sectionName = struct.unpack('I', f.read(4))[0]
-
-            # Read the type of this section.
-            sectionType = struct.unpack('I', f.read(4))[0]
-
-            # Read the virtual address of this section.
-            f.seek(sectionStart + (0x0c if eiClass == '32bits' else 0x10), os.SEEK_SET)
-            shAddr = readNumber(f, eiClass)
-
-            # Read the offset in file to this section.
-            shOffset = readNumber(f, eiClass)
-            f.seek(shOffset, os.SEEK_SET)
-
-            if sectionType == SHT_DYNAMIC:
-                # Read dynamic sections.
-                while True:
-                    # Read dynamic entries.
-                    dTag, dVal = readDynamicEntry(f, eiClass)
-
-                    if dTag == DT_NULL:
-                        # End of dynamic sections.
-                        break
-                    elif dTag == DT_NEEDED:
-                        # Dynamically imported libraries.
-                        neededPtr.append(dVal)
-                    elif dTag == DT_RPATH:
-                        # RPATHs.
-                        rpathsPtr.append(dVal)
-                    elif dTag == DT_RUNPATH:
-                        # RUNPATHs.
-                        runpathsPtr.append(dVal)
-            elif sectionType == SHT_STRTAB:
-                # Read string tables.
-                if section == shstrtabIndex:
-                    # We found the string table that stores sections names.
-                    shstrtab = [shAddr, shOffset]
-                else:
-                    # Save string tables for later usage.
-                    strtabs += [[sectionName, shAddr, shOffset]]
-
-            # Move to next section.
-            f.seek(sectionStart + (0x28 if eiClass == '32bits' else 0x40), os.SEEK_SET)
-
-        # Libraries names and RUNPATHs are located in '.dynstr' table.
-        strtab = []
-
-        for tab in strtabs:
-            f.seek(tab[0] - shstrtab[0] + shstrtab[1], os.SEEK_SET)
-
-            if readString(f) == b'.dynstr':
-                strtab = tab
-
-        # Read dynamically imported libraries.
-        needed = set()
-
-        for lib in neededPtr:
-            f.seek(lib + strtab[2], os.SEEK_SET)
-            needed.add(readString(f).decode(sys.getdefaultencoding()))
-
-        # Read RPATHs
-        rpaths = set()
-
-        for path in rpathsPtr:
-            f.seek(path + strtab[2], os.SEEK_SET)
-            rpaths.add(readString(f).decode(sys.getdefaultencoding()))
-
-        # Read RUNPATHs
-        runpaths = set()
-
-        for path in runpathsPtr:
-            f.seek(path + strtab[2], os.SEEK_SET)
-            runpaths.add(readString(f).decode(sys.getdefaultencoding()))
-
-        return {'machine': machine,
-                'imports': needed,
-                'rpath': rpaths,
-                'runpath': runpaths,
-                'type': fileType}
+                    if section['type'] == SHT_SYMTAB \
+                        or name.startswith(b'.debug') \
+                        or name.startswith(b'.zdebug'):
+                        return True
 
-    return {}
+                return False
+    except (OSError, ValueError, IndexError, struct.error):
+        pass
 
-def dependencies(binary):
+    return True
+
+def dynstrReferences(data, header, dynstr):
+    # Sections
+    SHT_DYNAMIC = 0x6
+    SHT_DYNSYM = 0xb
+    SHT_GNU_VERDEF = 0x6ffffffd
+    SHT_GNU_VERNEED = 0x6ffffffe
+
+    # Dynamic section entries pointing to a string.
+    DT_NEEDED = 1
+    DT_SONAME = 14
+    DT_AUXILIARY = 0x7ffffffd
+    DT_FILTER = 0x7fffffff
+
+    endian = header['endian']
+    references = []
+
+    for section in header['sections']:
+        if section['type'] == SHT_DYNAMIC:
+            for _, dTag, dVal in readDynamicEntries(data, header, section):
+                if dTag in [DT_NEEDED, DT_SONAME, DT_AUXILIARY, DT_FILTER]:
+                    references.append(dVal)
+        elif section['link'] != dynstr['index']:
+            continue
+        elif section['type'] == SHT_DYNSYM and section['entsize'] > 0:
+            # The symbol name is the first field of every symbol.
+            for symbol in range(section['offset'],
+                                section['offset'] + section['size'],
+                                section['entsize']):
+                references.append(struct.unpack_from(endian + 'I', data, symbol)[0])
+        elif section['type'] == SHT_GNU_VERNEED:
+            entry = section['offset']
+
+            for _ in range(section['info']):
+                _, count, fileName, aux, nextEntry = \
+                    struct.unpack_from(endian + 'HHIII', data, entry)
+                references.append(fileName)
+                auxEntry = entry + aux
+
+                for _ in range(count):
+                    _, _, _, auxName, nextAux = \
+                        struct.unpack_from(endian + 'IHHII', data, auxEntry)
+                    references.append(auxName)
+                    auxEntry += nextAux
+
+                entry += nextEntry
+        elif section['type'] == SHT_GNU_VERDEF:
+            entry = section['offset']
+
+            for _ in range(section['info']):
+                _, _, _, count, _, aux, nextEntry = \
+                    struct.unpack_from(endian + 'HHHHIII', data, entry)
+                auxEntry = entry + aux
+
+                for _ in range(count):
+                    auxName, nextAux = \
+                        struct.unpack_from(endian + 'II', data, auxEntry)
+                    references.append(auxName)
+                    auxEntry += nextAux
+
+                entry += nextEntry
+
+    return references
+
+def setRunpathMapped(data, runpath):
+    # Sections
+    SHT_STRTAB = 0x3
+    SHT_DYNAMIC = 0x6
+
+    # Dynamic section entries
+    DT_RPATH = 15
+    DT_RUNPATH = 0x1d
+
+    header = readHeader(data)
+
+    if header is None:
+        return False
+
+    dynstr = findSection(data, header, b'.dynstr', SHT_STRTAB)
+
+    if dynstr is None:
+        return False
+
+    pathEntries = []
+
+    for section in header['sections']:
+        if section['type'] == SHT_DYNAMIC:
+            for entry in readDynamicEntries(data, header, section):
+                if entry[1] in [DT_RPATH, DT_RUNPATH]:
+                    pathEntries.append(entry)
+
+    # Adding or merging entries requires growing the file.
+    if len(pathEntries) != 1:
+        return False
+
+    entry, dTag, dVal = pathEntries[0]
+    start = dynstr['offset'] + dVal
+    oldRunpath = readString(data, start)
+
+    if len(runpath) > len(oldRunpath) or dVal < 1 or data[start - 1] != 0:
+        return False
+
+    # The linker can merge strings, don't touch the old one if any other
+    # entry points inside of it.
+    for reference in dynstrReferences(data, header, dynstr):
+        if dVal <= reference <= dVal + len(oldRunpath):
+            return False
+
+    end = start + len(oldRunpath)
+    data[start: end + 1] = runpath + b'\x00' * (end + 1 - start - len(runpath))
+
+    # Same as patchelf, RPATHs are converted to RUNPATHs.
+    if dTag == DT_RPATH:
+        struct.pack_into(dynamicFormat(header), data, entry, DT_RUNPATH, dVal)
+
+    return True
+
+def setRunpath(binary, runpath):
+    try:
+        st = os.stat(binary)
+
+        with open(binary, 'r+b') as f:
+            with mmap.mmap(f.fileno(), 0) as data:
+                if not setRunpathMapped(data, runpath.encode(sys.getdefaultencoding())):
+                    return False
+
+                data.flush()
+    except (OSError, ValueError, IndexError, struct.error):
+        return False
+
+    # Make sure the modification time changes, so the cached dumps of the
+    # file are invalidated.
+    mtime = max(time.time_ns(), st.st_mtime_ns + 1)
+    os.utime(binary, ns=(st.st_atime_ns, mtime))
+
+    # Check that the file was properly patched.
     elfInfo = dump(binary)
 
+    return elfInfo.get('runpath') == {runpath} \
+           and len(elfInfo.get('rpath', {})) < 1
+
+def dependencies(binary):
+    elfInfo = DTBinary.binaryCache.memoize(dump, binary)
+
     if not elfInfo:
         return []
 
@@ -374,6 +712,22 @@ def dependencies(binary):
 
     return libs
 
+def searchDirs(binary):
+    # Directories where the libraries of the binary are looked for.
+    elfInfo = DTBinary.binaryCache.memoize(dump, binary)
+
+    if not elfInfo:
+        return []
+
+    rpaths, runpaths = readRpaths(elfInfo, os.path.dirname(binary))
+    searchPaths = rpaths + LD_LIBRARY_PATH + runpaths + LIBS_SEARCH_PATHS
+
+    # The loader cache changes whenever ldconfig is run.
+    if USE_LDSO_CACHE:
+        searchPaths.append('/etc/ld.so.cache')
+
+    return searchPaths
+
 def guess(mainExecutable, dependency):
     elfInfo = dump(mainExecutable)
 
@@ -23,6 +23,8 @@ import os
 import struct
 import sys
 
+from . import DTBinary
+
 
 # 32 bits magic number.
 MH_MAGIC = 0xfeedface # Native endian
@@ -66,10 +68,7 @@ def name(binary):
 def init(targetPlatform, targetArch, sysLibDir):
     pass
 
-def solveRefpath(path):
-    if not path.startswith('@'):
-        return path
-
+def refSearchPaths():
     searchPaths = []
 
     if 'DYLD_LIBRARY_PATH' in os.environ:
@@ -80,6 +79,14 @@ def solveRefpath(path):
 
     searchPaths += ['/usr/local/lib']
 
+    return searchPaths
+
+def solveRefpath(path):
+    if not path.startswith('@'):
+        return path
+
+    searchPaths = refSearchPaths()
+
     if path.endswith('.dylib'):
         dep = os.path.basename(path)
     else:
@@ -176,8 +183,12 @@ def dump(binary):
             'id': dylibId,
             'type': fileType}
 
+def hasSymbols(binary):
+    # Let the strip tool decide.
+    return True
+
 def dependencies(binary):
-    machInfo = dump(binary)
+    machInfo = DTBinary.binaryCache.memoize(dump, binary)
 
     if not machInfo:
         return []
@@ -197,6 +208,10 @@ def dependencies(binary):
 
     return libs
 
+def searchDirs(binary):
+    # The other imports are absolute paths.
+    return refSearchPaths()
+
 def guess(mainExecutable, dependency):
     dep = solveRefpath(dependency)
 
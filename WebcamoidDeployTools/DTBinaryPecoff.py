@@ -24,6 +24,7 @@ import os
 import struct
 import sys
 
+from . import DTBinary
 from . import DTUtils
 
 
@@ -178,8 +179,12 @@ def dump(binary):
     return {'imports': dllImports,
             'type': fileType}
 
+def hasSymbols(binary):
+    # Let the strip tool decide.
+    return True
+
 def dependencies(binary):
-    info = dump(binary)
+    info = DTBinary.binaryCache.memoize(dump, binary)
 
     if not 'imports' in info:
         return []
@@ -194,5 +199,12 @@ def dependencies(binary):
 
     return deps
 
+def searchDirs(binary):
+    # Same directories whereBin looks at.
+    pathSep = ';' if DTUtils.hostPlatform() == 'windows' else ':'
+    sysPath = os.environ['PATH'].split(pathSep) if 'PATH' in os.environ else []
+
+    return EXTRA_LIBRARY_PATH + sysPath
+
 def guess(mainExecutable, dependency):
     return DTUtils.whereBin(dependency, EXTRA_LIBRARY_PATH)
@@ -20,8 +20,8 @@
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
 import os
-import tarfile
 
+from . import DTArchive
 from . import DTUtils
 
 
@@ -49,6 +49,10 @@ def run(globs, configs, dataDir, outputDir, mutex):
     defaultShowTargetPlatform = 'true' if defaultShowTargetPlatform else 'false'
     showTargetPlatform = configs.get('CompressedTarBz2', 'showTargetPlatform', fallback=defaultShowTargetPlatform).strip()
     showTargetPlatform = DTUtils.toBool(showTargetPlatform)
+    threads = configs.get('CompressedTarBz2', 'threads', fallback='0').strip()
+    threads = DTUtils.toInt(threads)
+    level = configs.get('CompressedTarBz2', 'level', fallback='9').strip()
+    level = min(max(DTUtils.toInt(level, 9), 1), 9)
     outPackage = os.path.join(outputDir, packageName)
 
     if showTargetPlatform:
@@ -65,8 +69,15 @@ def run(globs, configs, dataDir, outputDir, mutex):
     if os.path.exists(outPackage):
         os.remove(outPackage)
 
-    with tarfile.open(outPackage, 'w:bz2') as tar:
-        tar.add(dataDir, name)
+    DTArchive.writeTar(outPackage,
+                       dataDir,
+                       name,
+                       DTArchive.bzip2Block(level),
+                       level * 100000,
+                       threads,
+                       reader=DTArchive.dataTreeReader(globs, 'CompressedTarBz2'),
+                       classifier=DTArchive.dataClassifier(configs),
+                       codec='bzip2')
 
     if not os.path.exists(outPackage):
         return
@@ -20,8 +20,8 @@
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
 import os
-import tarfile
 
+from . import DTArchive
 from . import DTUtils
 
 
@@ -49,6 +49,10 @@ def run(globs, configs, dataDir, outputDir, mutex):
     defaultShowTargetPlatform = 'true' if defaultShowTargetPlatform else 'false'
     showTargetPlatform = configs.get('CompressedTarGz', 'showTargetPlatform', fallback=defaultShowTargetPlatform).strip()
     showTargetPlatform = DTUtils.toBool(showTargetPlatform)
+    threads = configs.get('CompressedTarGz', 'threads', fallback='0').strip()
+    threads = DTUtils.toInt(threads)
+    level = configs.get('CompressedTarGz', 'level', fallback='9').strip()
+    level = min(max(DTUtils.toInt(level, 9), 1), 9)
     outPackage = os.path.join(outputDir, packageName)
 
     if showTargetPlatform:
@@ -65,8 +69,16 @@ def run(globs, configs, dataDir, outputDir, mutex):
     if os.path.exists(outPackage):
         os.remove(outPackage)
 
-    with tarfile.open(outPackage, 'w:gz') as tar:
-        tar.add(dataDir, name)
+    DTArchive.writeTar(outPackage,
+                       dataDir,
+                       name,
+                       DTArchive.gzipBlock(level),
+                       1024 * 1024,
+                       threads,
+                       reader=DTArchive.dataTreeReader(globs, 'CompressedTarGz'),
+                       storeCompress=DTArchive.gzipBlock(0),
+                       classifier=DTArchive.dataClassifier(configs),
+                       codec='gzip')
 
     if not os.path.exists(outPackage):
         return
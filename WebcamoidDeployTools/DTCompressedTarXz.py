@@ -19,9 +19,10 @@
 #
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
+import lzma
 import os
-import tarfile
 
+from . import DTArchive
 from . import DTUtils
 
 
@@ -49,6 +50,14 @@ def run(globs, configs, dataDir, outputDir, mutex):
     defaultShowTargetPlatform = 'true' if defaultShowTargetPlatform else 'false'
     showTargetPlatform = configs.get('CompressedTarXz', 'showTargetPlatform', fallback=defaultShowTargetPlatform).strip()
     showTargetPlatform = DTUtils.toBool(showTargetPlatform)
+    threads = configs.get('CompressedTarXz', 'threads', fallback='0').strip()
+    threads = DTUtils.toInt(threads)
+    preset = configs.get('CompressedTarXz', 'preset', fallback='6').strip()
+    preset = min(max(DTUtils.toInt(preset, 6), 0), 9)
+    extreme = configs.get('CompressedTarXz', 'extreme', fallback='false').strip()
+    extreme = DTUtils.toBool(extreme)
+    blockSize = configs.get('CompressedTarXz', 'blockSize', fallback='0').strip()
+    blockSize = DTUtils.toInt(blockSize)
     outPackage = os.path.join(outputDir, packageName)
 
     if showTargetPlatform:
@@ -65,8 +74,27 @@ def run(globs, configs, dataDir, outputDir, mutex):
     if os.path.exists(outPackage):
         os.remove(outPackage)
 
-    with tarfile.open(outPackage, 'w:xz') as tar:
-        tar.add(dataDir, name)
+    # Use three times the dictionary size as block size by default, like
+    # xz does in multi-threaded mode.
+    if blockSize < 1:
+        blockSize = 3 * DTArchive.xzDictSize(preset, 1 << 30)
+
+    dictSize = DTArchive.xzDictSize(preset, blockSize)
+
+    if extreme:
+        preset |= lzma.PRESET_EXTREME
+
+    DTArchive.writeTar(outPackage,
+                       dataDir,
+                       name,
+                       DTArchive.xzBlock(preset, dictSize),
+                       blockSize,
+                       threads,
+                       DTArchive.XzWriter,
+                       DTArchive.dataTreeReader(globs, 'CompressedTarXz'),
+                       DTArchive.xzBlock(0, DTArchive.xzDictSize(0, blockSize)),
+                       DTArchive.dataClassifier(configs),
+                       'xz')
 
     if not os.path.exists(outPackage):
         return
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2021  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import os
+import tarfile
+
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+from . import DTArchive
+from . import DTUtils
+
+
+def platforms():
+    return ['mac', 'posix', 'windows']
+
+def isAvailable(configs):
+    # Requires Python 3.14 or newer.
+    return zstd is not None
+
+def run(globs, configs, dataDir, outputDir, mutex):
+    sourcesDir = configs.get('Package', 'sourcesDir', fallback='.').strip()
+    name = configs.get('Package', 'name', fallback='app').strip()
+    version = DTUtils.programVersion(configs, sourcesDir)
+    packageName = configs.get('CompressedTarZst', 'name', fallback=name).strip()
+    defaultPkgTargetPlatform = configs.get('Package', 'targetPlatform', fallback='').strip()
+    pkgTargetPlatform = configs.get('CompressedTarZst', 'pkgTargetPlatform', fallback=defaultPkgTargetPlatform).strip()
+    targetArch = configs.get('Package', 'targetArch', fallback='').strip()
+    defaultHideArch = configs.get('Package', 'hideArch', fallback='false').strip()
+    defaultHideArch = DTUtils.toBool(defaultHideArch)
+    defaultHideArch = 'true' if defaultHideArch else 'false'
+    hideArch = configs.get('CompressedTarZst', 'hideArch', fallback=defaultHideArch).strip()
+    hideArch = DTUtils.toBool(hideArch)
+    defaultShowTargetPlatform = configs.get('Package', 'showTargetPlatform', fallback='true').strip()
+    defaultShowTargetPlatform = DTUtils.toBool(defaultShowTargetPlatform)
+    defaultShowTargetPlatform = 'true' if defaultShowTargetPlatform else 'false'
+    showTargetPlatform = configs.get('CompressedTarZst', 'showTargetPlatform', fallback=defaultShowTargetPlatform).strip()
+    showTargetPlatform = DTUtils.toBool(showTargetPlatform)
+    threads = configs.get('CompressedTarZst', 'threads', fallback='0').strip()
+    threads = DTUtils.toInt(threads)
+    level = configs.get('CompressedTarZst', 'level', fallback='19').strip()
+    level = DTUtils.toInt(level, 19)
+    longDistance = configs.get('CompressedTarZst', 'longDistance', fallback='false').strip()
+    longDistance = DTUtils.toBool(longDistance)
+    windowLog = configs.get('CompressedTarZst', 'windowLog', fallback='0').strip()
+    windowLog = DTUtils.toInt(windowLog)
+    outPackage = os.path.join(outputDir, packageName)
+
+    if showTargetPlatform:
+        outPackage += '-' + pkgTargetPlatform
+
+    outPackage += '-' + version
+
+    if not hideArch:
+        outPackage += '-' + targetArch
+
+    outPackage += '.tar.zst'
+
+    # Remove old file
+    if os.path.exists(outPackage):
+        os.remove(outPackage)
+
+    if threads < 1:
+        threads = DTUtils.numThreads()
+
+    # Same default window as 'zstd --long'.
+    if longDistance and windowLog < 1:
+        windowLog = 27
+
+    parameters = {zstd.CompressionParameter.compression_level: level,
+                  zstd.CompressionParameter.nb_workers: threads,
+                  zstd.CompressionParameter.enable_long_distance_matching: longDistance,
+                  zstd.CompressionParameter.window_log: windowLog}
+    options = {}
+
+    # Clamp the values to what the zstd library supports, nb_workers is
+    # limited to 0 if it was built without multi-threading support.
+    for parameter, value in parameters.items():
+        if parameter == zstd.CompressionParameter.window_log and value < 1:
+            continue
+
+        lower, upper = parameter.bounds()
+        options[parameter] = min(max(int(value), lower), upper)
+
+    reader = DTArchive.dataTreeReader(globs, 'CompressedTarZst')
+
+    if reader:
+        with zstd.ZstdFile(outPackage, 'w', options=options) as f:
+            for chunk in reader:
+                f.write(chunk)
+    else:
+        with tarfile.open(outPackage, 'w:zst', options=options) as tar:
+            DTArchive.addTree(tar,
+                              dataDir,
+                              name,
+                              DTArchive.dataClassifier(configs))
+
+    if not os.path.exists(outPackage):
+        return
+
+    mutex.acquire()
+
+    if not 'outputPackages' in globs:
+        globs['outputPackages'] = []
+
+    globs['outputPackages'].append(outPackage)
+    mutex.release()
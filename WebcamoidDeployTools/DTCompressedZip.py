@@ -20,8 +20,8 @@
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
 import os
-import zipfile
 
+from . import DTArchive
 from . import DTUtils
 
 
@@ -49,6 +49,24 @@ def run(globs, configs, dataDir, outputDir, mutex):
     defaultShowTargetPlatform = 'true' if defaultShowTargetPlatform else 'false'
     showTargetPlatform = configs.get('CompressedZip', 'showTargetPlatform', fallback=defaultShowTargetPlatform).strip()
     showTargetPlatform = DTUtils.toBool(showTargetPlatform)
+    threads = configs.get('CompressedZip', 'threads', fallback='0').strip()
+    threads = DTUtils.toInt(threads)
+    level = configs.get('CompressedZip', 'level', fallback='6').strip()
+    level = min(max(DTUtils.toInt(level, 6), 0), 9)
+    storeOnly = configs.get('CompressedZip', 'storeOnly', fallback='false').strip()
+    storeOnly = DTUtils.toBool(storeOnly)
+    storeExtensions = configs.get('CompressedZip', 'storeExtensions', fallback='').strip()
+    # By default symlinks are followed and the contents of their target are
+    # stored. Symlink entries are smaller, but not every unzip tool restores
+    # them.
+    storeSymlinks = configs.get('CompressedZip', 'storeSymlinks', fallback='false').strip()
+    storeSymlinks = DTUtils.toBool(storeSymlinks)
+
+    if storeExtensions == '':
+        storeExtensions = DTArchive.ZIP_STORE_EXTENSIONS
+    else:
+        storeExtensions = [ext.strip() for ext in storeExtensions.split(',')]
+
     outPackage = os.path.join(outputDir, packageName)
 
     if showTargetPlatform:
@@ -65,13 +83,16 @@ def run(globs, configs, dataDir, outputDir, mutex):
     if os.path.exists(outPackage):
         os.remove(outPackage)
 
-    with zipfile.ZipFile(outPackage, 'w', zipfile.ZIP_DEFLATED, False) as zipFile:
-        for root, dirs, files in os.walk(dataDir):
-            for f in dirs + files:
-                filePath = os.path.join(root, f)
-                dstPath = os.path.join(name,
-                                       filePath.replace(dataDir + os.sep, ''))
-                zipFile.write(filePath, dstPath)
+    DTArchive.writeZip(outPackage,
+                       dataDir,
+                       name,
+                       level,
+                       storeOnly,
+                       storeExtensions,
+                       threads,
+                       reader=DTArchive.dataTreeReader(globs, 'CompressedZip'),
+                       classifier=DTArchive.dataClassifier(configs),
+                       storeSymlinks=storeSymlinks)
 
     if not os.path.exists(outPackage):
         return
@@ -23,7 +23,6 @@ import math
 import os
 import subprocess
 import sys
-import tempfile
 import time
 
 from . import DTUtils
@@ -59,13 +58,13 @@ def createDmg(globs,
               name,
               version,
               appIcon):
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with DTUtils.stagingDir(os.path.dirname(outPackage)) as tmpdir:
         staggingDir = os.path.join(tmpdir, 'stagging')
 
         if not os.path.exists(staggingDir):
             os.makedirs(staggingDir)
 
-        DTUtils.copy(dataDir, staggingDir)
+        DTUtils.copy(dataDir, staggingDir, hardlinks=True)
         imageSize = dirSize(staggingDir)
         tmpDmg = os.path.join(tmpdir, name + '_tmp.dmg')
         volumeName = "{}-{}".format(name, version)
@@ -51,7 +51,8 @@ def pkgconfVariable(package, var):
 
     return stdout.decode(sys.getdefaultencoding()).strip()
 
-def dependsOnGStreammer(targetPlatform,
+def dependsOnGStreammer(globs,
+                        targetPlatform,
                         targetArch,
                         dataDir,
                         sysLibDir):
@@ -68,7 +69,8 @@ def dependsOnGStreammer(targetPlatform,
     else:
         gstLibName = 'gstreamer-1.0'
 
-    for dep in solver.scanDependencies(dataDir):
+    for dep in solver.scanDependencies(dataDir,
+                                       index=DTBinary.scanIndex(globs)):
         libName = solver.name(dep)
 
         if libName == gstLibName:
@@ -157,7 +159,8 @@ def preRun(globs, configs, dataDir):
 
     verbose = configs.get('GStreamer', 'verbose', fallback='false').strip()
     verbose = DTUtils.toBool(verbose)
-    depends = dependsOnGStreammer(targetPlatform,
+    depends = dependsOnGStreammer(globs,
+                                  targetPlatform,
                                   targetArch,
                                   dataDir,
                                   sysLibDir)
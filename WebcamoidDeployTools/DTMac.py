@@ -23,7 +23,6 @@ import os
 import subprocess
 import sys
 import threading
-import time
 
 from . import DTBinary
 from . import DTGit
@@ -228,24 +227,13 @@ def fixLibRpath(solver, mutex, mach, binDir, libDir):
 
 def fixRpaths(solver, dataDir, binDir, libDir):
     mutex = threading.Lock()
-    threads = []
 
-    for mach in solver.find(dataDir):
-        thread = threading.Thread(target=fixLibRpath,
-                                  args=(solver,
-                                        mutex,
-                                        mach,
-                                        binDir,
-                                        libDir,))
-        threads.append(thread)
+    def fixRpath(mach):
+        fixLibRpath(solver, mutex, mach, binDir, libDir)
 
-        while threading.active_count() >= DTUtils.numThreads():
-            time.sleep(0.25)
-
-        thread.start()
-
-    for thread in threads:
-        thread.join()
+    for mach, _, error in DTUtils.parallelMap(fixRpath, solver.find(dataDir)):
+        if error is not None:
+            print('Failed to fix the rpaths of {}: {}'.format(mach, error))
 
 def sysInfo():
     process = subprocess.Popen(['sw_vers'], # nosec
@@ -422,7 +410,11 @@ def preRun(globs, configs, dataDir):
                           stripCmd)
     print()
     print('Stripping symbols')
-    solver.stripSymbols(dataDir)
+
+    for binary, (status, message) in sorted(solver.stripSymbols(dataDir).items()):
+        if status == 'failed':
+            print('Failed to strip {}: {}'.format(binary, message))
+
     print('Resetting file permissions')
     solver.resetFilePermissions(dataDir)
     print('Removing unnecessary files')
@@ -44,13 +44,13 @@ def createPkg(globs,
               installScripts,
               uninstallScript,
               verbose):
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with DTUtils.stagingDir(os.path.dirname(outPackage)) as tmpdir:
         installDestDir = tmpdir
 
         if subFolder != '':
             installDestDir = os.path.join(tmpdir, subFolder)
 
-        DTUtils.copy(dataDir, installDestDir)
+        DTUtils.copy(dataDir, installDestDir, hardlinks=True)
 
         if uninstallScript != '':
             DTUtils.copy(uninstallScript, installDestDir)
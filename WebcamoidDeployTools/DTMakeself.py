@@ -21,7 +21,6 @@
 
 import os
 import subprocess
-import tempfile
 
 from . import DTUtils
 
@@ -37,10 +36,11 @@ def createInstaller(globs,
                     licenseFile,
                     targetDir,
                     installScript,
-                    uninstallScript):
-    with tempfile.TemporaryDirectory() as tmpdir:
+                    uninstallScript,
+                    threads=0):
+    with DTUtils.stagingDir(os.path.dirname(outPackage)) as tmpdir:
         licenseOutFile = os.path.basename(licenseFile)
-        DTUtils.copy(dataDir, tmpdir)
+        DTUtils.copy(dataDir, tmpdir, hardlinks=True)
         startupScript = ''
         params = [makeself(),
                   '--xz',
@@ -59,9 +59,16 @@ def createInstaller(globs,
                    outPackage,
                    label,
                    startupScript]
+        penv = os.environ.copy()
+
+        # Limit the threads used by xz.
+        if threads > 0:
+            penv['XZ_DEFAULTS'] = '-T{}'.format(threads)
+
         process = subprocess.Popen(params, #nosec
                                    stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE)
+                                   stderr=subprocess.PIPE,
+                                   env=penv)
         process.communicate()
 
         if not os.path.exists(outPackage):
@@ -115,6 +122,8 @@ def run(globs, configs, dataDir, outputDir, mutex):
     defaultShowTargetPlatform = 'true' if defaultShowTargetPlatform else 'false'
     showTargetPlatform = configs.get('Makeself', 'showTargetPlatform', fallback=defaultShowTargetPlatform).strip()
     showTargetPlatform = DTUtils.toBool(showTargetPlatform)
+    threads = configs.get('Makeself', 'threads', fallback='0').strip()
+    threads = DTUtils.toInt(threads)
     outPackage = os.path.join(outputDir, packageName)
 
     if showTargetPlatform:
@@ -139,4 +148,5 @@ def run(globs, configs, dataDir, outputDir, mutex):
                     licenseFile,
                     targetDir,
                     installScript,
-                    uninstallScript)
+                    uninstallScript,
+                    threads)
@@ -42,7 +42,8 @@ def copyPipeWireModules(globs,
                                   sysLibDir,
                                   stripCmd)
 
-    for dep in solver.scanDependencies(dataDir):
+    for dep in solver.scanDependencies(dataDir,
+                                       index=DTBinary.scanIndex(globs)):
         libName = solver.name(dep)
 
         if libName == 'pipewire-0.3':
@@ -88,7 +89,8 @@ def copySpaPlugins(globs,
                                   sysLibDir,
                                   stripCmd)
 
-    for dep in solver.scanDependencies(dataDir):
+    for dep in solver.scanDependencies(dataDir,
+                                       index=DTBinary.scanIndex(globs)):
         libName = solver.name(dep)
 
         if libName == 'pipewire-0.3':
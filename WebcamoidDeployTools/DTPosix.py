@@ -23,15 +23,15 @@ import os
 import platform
 import subprocess
 import threading
-import time
 
 from . import DTBinary
+from . import DTBinaryElf
 from . import DTGit
 from . import DTSystemPackages
 from . import DTUtils
 
 
-def fixLibRpath(solver, mutex, elf, dataDir, libDir):
+def fixLibRpath(solver, mutex, elf, dataDir, libDir, patchelf):
     log = '\tFixing {}\n\n'.format(elf)
     elfInfo = solver.dump(elf)
     elfDir = os.path.dirname(elf)
@@ -45,44 +45,42 @@ def fixLibRpath(solver, mutex, elf, dataDir, libDir):
 
     # Change rpath
 
-    if rpath != '' and not rpath in elfInfo['rpath']:
-        log += '\t\tChanging rpaths from {} to {}\n'.format(elfInfo['rpath'], rpath)
-
-        # Set our rpath
-        process = subprocess.Popen(['patchelf', # nosec
-                                    '--set-rpath', rpath, elf],
-                                    stdout=subprocess.PIPE)
-        process.communicate()
+    if rpath != '' \
+        and not rpath in elfInfo['rpath'] \
+        and not rpath in elfInfo['runpath']:
+        log += '\t\tChanging rpaths from {} to {}\n'.format(elfInfo['rpath'] | elfInfo['runpath'], rpath)
+
+        # Try to overwrite the current rpath in the file first, and use
+        # patchelf only when the file must grow.
+        if DTBinaryElf.setRunpath(elf, rpath):
+            log += '\t\tPatched in place\n'
+        elif patchelf == '':
+            log += '\t\tpatchelf not found\n'
+        else:
+            # Set our rpath
+            process = subprocess.Popen([patchelf, # nosec
+                                        '--set-rpath', rpath, elf],
+                                        stdout=subprocess.PIPE)
+            process.communicate()
 
     mutex.acquire()
     print(log)
     mutex.release()
 
 def fixRpaths(solver, dataDir, libDir):
-    if DTUtils.whereBin('patchelf') == '':
-        print('patchelf not found')
+    patchelf = DTUtils.whereBin('patchelf')
 
-        return
+    if patchelf == '':
+        print('patchelf not found, only rpaths that fit in the binaries will be changed')
 
     mutex = threading.Lock()
-    threads = []
-
-    for elf in solver.find(dataDir):
-        thread = threading.Thread(target=fixLibRpath,
-                                  args=(solver,
-                                        mutex,
-                                        elf,
-                                        dataDir,
-                                        libDir,))
-        threads.append(thread)
-
-        while threading.active_count() >= DTUtils.numThreads():
-            time.sleep(0.25)
 
-        thread.start()
+    def fixRpath(elf):
+        fixLibRpath(solver, mutex, elf, dataDir, libDir, patchelf)
 
-    for thread in threads:
-        thread.join()
+    for elf, _, error in DTUtils.parallelMap(fixRpath, solver.find(dataDir)):
+        if error is not None:
+            print('Failed to fix the rpaths of {}: {}'.format(elf, error))
 
 def sysInfo():
     info = ''
@@ -243,7 +241,11 @@ def preRun(globs, configs, dataDir):
                           stripCmd)
     print()
     print('Stripping symbols')
-    solver.stripSymbols(dataDir)
+
+    for binary, (status, message) in sorted(solver.stripSymbols(dataDir).items()):
+        if status == 'failed':
+            print('Failed to strip {}: {}'.format(binary, message))
+
     print('Resetting file permissions')
     solver.resetFilePermissions(dataDir)
     print()
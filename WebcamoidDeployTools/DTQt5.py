@@ -567,7 +567,8 @@ def solvedepsPlugins(globs,
                                   stripCmd)
     plugins = []
 
-    for dep in solver.scanDependencies(dataDir):
+    for dep in solver.scanDependencies(dataDir,
+                                       index=DTBinary.scanIndex(globs)):
         libName = solver.name(dep)
 
         if not libName in pluginsMap:
@@ -22,7 +22,6 @@
 import os
 import re
 import subprocess
-import tempfile
 import time
 
 from . import DTUtils
@@ -113,7 +112,7 @@ def createInstaller(globs,
                     changeLog,
                     requiresAdminRights,
                     verbose):
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with DTUtils.stagingDir(os.path.dirname(outPackage)) as tmpdir:
         # Create layout
         componentName = '{}.{}'.format(organization, name)
         installerConfig = os.path.join(tmpdir, 'config')
@@ -145,7 +144,7 @@ def createInstaller(globs,
             licenseOutFile += '.txt'
 
         DTUtils.copy(licenseFile, os.path.join(installerMetaDir, licenseOutFile))
-        DTUtils.copy(dataDir, installerDataDir)
+        DTUtils.copy(dataDir, installerDataDir, hardlinks=True)
 
         configXml = os.path.join(installerConfig, 'config.xml')
 
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2021  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import importlib
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from . import DTArchive
+from . import DTUtils
+
+
+# Formats run by this process.
+FORMATS_RUN = 0
+
+def runFormat(format, configs, dataDir, outputDir):
+    # Runs a packaging format in a worker process. The format gets its own
+    # globals and mutex, and everything it shares with the other formats is
+    # returned to be merged in the parent process.
+    global FORMATS_RUN
+
+    FORMATS_RUN += 1
+    globs = {}
+
+    # Return only the statistics of this format if the worker is reused.
+    DTArchive.resetCodecsStats()
+
+    try:
+        mod = importlib.import_module('WebcamoidDeployTools.DT' + format)
+        mod.run(globs, configs, dataDir, outputDir, threading.Lock())
+    finally:
+        sys.stdout.flush()
+
+    # The peak memory of a reused worker includes the previous formats, leave
+    # it unknown.
+    return {'outputPackages': globs.get('outputPackages', []),
+            'codecsStats': DTArchive.codecsStats(),
+            'peakRss': peakRss() if FORMATS_RUN < 2 else 0}
+
+def peakRss():
+    # Maximum resident memory used by this process.
+    if not resource:
+        return 0
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux and BSDs give the size in KiB.
+    if sys.platform == 'darwin':
+        return rss
+
+    return 1024 * rss
+
+def availableMemory():
+    # Returns 0 if it's unknown.
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return 1024 * int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return 0
+
+class JobHistory:
+    # Duration and peak memory of every packaging format in the previous
+    # runs of each project.
+    def __init__(self, path, project):
+        super().__init__()
+        self.path = path
+        self.project = project
+        self.mutex = threading.Lock()
+        self.projects = {}
+
+        if self.path != '' and os.path.exists(self.path):
+            try:
+                with open(self.path) as historyFile:
+                    self.projects = json.load(historyFile)
+            except (OSError, ValueError):
+                self.projects = {}
+
+        if not isinstance(self.projects.get(self.project), dict):
+            self.projects[self.project] = {}
+
+    def duration(self, format):
+        with self.mutex:
+            return self.projects[self.project].get(format, {}).get('duration')
+
+    def rss(self, format):
+        with self.mutex:
+            return self.projects[self.project].get(format, {}).get('rss', 0)
+
+    def record(self, format, duration, rss=0):
+        # The memory is recorded only if it's known, the formats running in
+        # the main process don't have their own.
+        entry = {'duration': duration}
+
+        if rss > 0:
+            entry['rss'] = rss
+
+        with self.mutex:
+            self.projects[self.project][format] = entry
+
+    def save(self):
+        if self.path == '':
+            return
+
+        historyDir = os.path.dirname(os.path.abspath(self.path))
+
+        if not os.path.exists(historyDir):
+            os.makedirs(historyDir)
+
+        with self.mutex:
+            with open(self.path + '.tmp', 'w') as historyFile:
+                json.dump(self.projects, historyFile, indent=4, sort_keys=True)
+
+            os.replace(self.path + '.tmp', self.path)
+
+class PackagingJob:
+    # Formats that must be started at the same time, like the ones reading
+    # the same data tree stream.
+    def __init__(self, formats, history):
+        super().__init__()
+        self.formats = formats
+        self.duration = None
+        self.rss = 0
+
+        for format in formats:
+            duration = history.duration(format)
+
+            if duration is None:
+                self.duration = None
+
+                break
+
+            self.duration = max(self.duration or 0, duration)
+
+        # Only the formats running in their own process have their memory
+        # measured, the others count as 0 and are never held back by the
+        # memory limit.
+        for format in formats:
+            self.rss += history.rss(format)
+
+def packagingJobs(formats, groups, history):
+    # Longest job first, the jobs never measured go first since they could
+    # be the longest ones. The remaining order is the order of the formats.
+    jobs = []
+    grouped = set()
+
+    for format in formats:
+        if format in grouped:
+            continue
+
+        for group in groups:
+            if format in group:
+                jobs.append(PackagingJob(group, history))
+                grouped.update(group)
+
+                break
+        else:
+            jobs.append(PackagingJob([format], history))
+
+    return sorted(jobs, key=lambda job: (job.duration is not None,
+                                         -(job.duration or 0)))
+
+def runJobs(jobs, run, history, nthreads=0, memory=0):
+    # Runs the packaging jobs in the given order, starting as many of them
+    # as the threads and the memory available allow. Every format gets a
+    # share of the free threads, and run(format, threads) returns the peak
+    # memory it used, or 0 if unknown. A job is always started if nothing
+    # else is running.
+    if nthreads < 1:
+        nthreads = DTUtils.numThreads()
+
+    waiting = list(jobs)
+    finished = queue.Queue()
+    pending = {}
+    freeThreads = nthreads
+    freeMemory = memory
+    runningFormats = 0
+
+    def runFormat(job, format, threads):
+        try:
+            startTime = time.monotonic()
+            rss = run(format, threads)
+            history.record(format, time.monotonic() - startTime, rss)
+        finally:
+            finished.put((job, threads))
+
+    while len(waiting) > 0 or len(pending) > 0:
+        for job in list(waiting):
+            if len(pending) > 0:
+                if runningFormats + len(job.formats) > nthreads:
+                    continue
+
+                if memory > 0 and job.rss > freeMemory:
+                    continue
+
+            waitingFormats = sum([len(waitingJob.formats) for waitingJob in waiting])
+            slots = max(1, min(waitingFormats, nthreads - runningFormats))
+            threads = min(math.ceil(freeThreads / slots),
+                          freeThreads // len(job.formats))
+            threads = max(1, threads)
+            waiting.remove(job)
+            pending[job] = len(job.formats)
+            freeMemory -= job.rss
+
+            for format in job.formats:
+                print('Starting {}, threads: {}'.format(format, threads))
+                freeThreads -= threads
+                runningFormats += 1
+                threading.Thread(target=runFormat,
+                                 args=(job, format, threads)).start()
+
+        job, threads = finished.get()
+        freeThreads += threads
+        runningFormats -= 1
+        pending[job] -= 1
+
+        if pending[job] < 1:
+            del pending[job]
+            freeMemory += job.rss
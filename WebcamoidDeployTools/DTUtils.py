@@ -19,19 +19,38 @@
 #
 # Web-Site: http://github.com/webcamoid/DeployTools/
 
+import collections
+import concurrent.futures
 import configparser
+import errno
 import hashlib
+import json
 import math
 import multiprocessing
 import os
 import shutil
+import stat
 import sys
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 from . import DTGit
 from . import DTBinary
 from . import DTMac
 
 
+# linux/fs.h
+FICLONE = 0x40049409
+
+COPY_STATS = {'files': 0, 'bytes': 0, 'skipped': 0, 'methods': {}}
+COPY_STATS_MUTEX = threading.Lock()
+COPY_MANIFEST = None
+
 def hostPlatform():
     if os.name == 'posix' and sys.platform.startswith('darwin'):
         return 'mac'
@@ -54,6 +73,18 @@ def toBool(string):
 
     return False
 
+def toInt(string, default=0):
+    try:
+        return int(string)
+    except ValueError:
+        return default
+
+def toFloat(string, default=0.0):
+    try:
+        return float(string)
+    except ValueError:
+        return default
+
 def whereBin(binary, extraPaths=[]):
     pathSep = ';' if hostPlatform() == 'windows' else ':'
     sysPath = os.environ['PATH'].split(pathSep) if 'PATH' in os.environ else []
@@ -84,8 +115,303 @@ def repositionPath(path, start=os.curdir):
 
     return path
 
-def copy(src, dst='.', copyReals=False, overwrite=True, rootPath=''):
+def copyStats():
+    with COPY_STATS_MUTEX:
+        return {'files': COPY_STATS['files'],
+                'bytes': COPY_STATS['bytes'],
+                'skipped': COPY_STATS['skipped'],
+                'methods': dict(COPY_STATS['methods'])}
+
+class CopyManifest:
+    # Sources of the files copied in the previous runs. A file is not copied
+    # again if its source didn't changed, and the copy was not modified since
+    # the previous run finished, the copies are usually stripped or patched
+    # after being copied, so they can't be compared with the sources.
+    def __init__(self, path, useHash=False, skipUnchanged=True):
+        super().__init__()
+        self.path = path
+        self.useHash = useHash
+        self.skipUnchanged = skipUnchanged
+        self.mutex = threading.Lock()
+        self.previous = {}
+        self.current = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as manifestFile:
+                    manifest = json.load(manifestFile)
+
+                if manifest.get('useHash') == self.useHash:
+                    self.previous = manifest.get('files', {})
+            except (OSError, ValueError, AttributeError):
+                self.previous = {}
+
+    def sourceId(self, src):
+        st = os.stat(src)
+
+        if self.useHash:
+            return [os.path.abspath(src), st.st_size, sha256sum(src)]
+
+        return [os.path.abspath(src), st.st_size, st.st_mtime_ns]
+
+    @staticmethod
+    def copyId(dst):
+        st = os.stat(dst, follow_symlinks=False)
+
+        if not stat.S_ISREG(st.st_mode):
+            return None
+
+        return [st.st_size, st.st_mtime_ns]
+
+    def isUnchanged(self, src, dst):
+        if not self.skipUnchanged:
+            return False
+
+        dst = os.path.abspath(dst)
+
+        with self.mutex:
+            entry = self.previous.get(dst)
+
+        if entry is None:
+            return False
+
+        try:
+            sourceId = self.sourceId(src)
+
+            if sourceId != entry['source'] or self.copyId(dst) != entry['copy']:
+                return False
+        except (OSError, KeyError, TypeError):
+            return False
+
+        with self.mutex:
+            self.current[dst] = sourceId
+
+        return True
+
+    def record(self, src, dst):
+        try:
+            sourceId = self.sourceId(src)
+        except OSError:
+            return
+
+        with self.mutex:
+            self.current[os.path.abspath(dst)] = sourceId
+
+    def save(self):
+        # The state of the copies is saved after all the modifications made
+        # to them.
+        files = {}
+
+        with self.mutex:
+            current = dict(self.current)
+
+        for dst, sourceId in current.items():
+            try:
+                copyId = self.copyId(dst)
+            except OSError:
+                continue
+
+            if copyId is not None:
+                files[dst] = {'source': sourceId, 'copy': copyId}
+
+        manifestDir = os.path.dirname(os.path.abspath(self.path))
+
+        if not os.path.exists(manifestDir):
+            os.makedirs(manifestDir)
+
+        with open(self.path + '.tmp', 'w') as manifestFile:
+            json.dump({'useHash': self.useHash, 'files': files}, manifestFile)
+
+        os.replace(self.path + '.tmp', self.path)
+
+def copyManifestPath(cacheDir, dataDir):
+    # One manifest per data directory sharing the same cache directory.
+    dataDir = os.path.abspath(dataDir)
+    dataDirHash = hashlib.sha256(dataDir.encode()).hexdigest()[: 16]
+
+    return os.path.join(cacheDir, 'copies-{}.json'.format(dataDirHash))
+
+def openCopyManifest(path, useHash=False, skipUnchanged=True):
+    global COPY_MANIFEST
+
+    closeCopyManifest()
+    COPY_MANIFEST = CopyManifest(path, useHash, skipUnchanged)
+
+def closeCopyManifest():
+    global COPY_MANIFEST
+
+    if COPY_MANIFEST is not None:
+        COPY_MANIFEST.save()
+        COPY_MANIFEST = None
+
+def isUnchanged(src, dst):
+    manifest = COPY_MANIFEST
+
+    if manifest is None or not manifest.isUnchanged(src, dst):
+        return False
+
+    with COPY_STATS_MUTEX:
+        COPY_STATS['skipped'] += 1
+
+    return True
+
+def copyFileContents(fsrc, fdst, size):
+    if sys.platform.startswith('linux'):
+        # Share the data blocks in copy-on-write file systems (btrfs, XFS).
+        if fcntl:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+                return 'reflink'
+            except OSError:
+                pass
+
+        # Copy inside the kernel, some file systems can still share or
+        # offload the data.
+        for method in ['copy_file_range', 'sendfile']:
+            if not hasattr(os, method):
+                continue
+
+            offset = 0
+
+            try:
+                while offset < size:
+                    if method == 'copy_file_range':
+                        copied = os.copy_file_range(fsrc.fileno(),
+                                                    fdst.fileno(),
+                                                    size - offset,
+                                                    offset,
+                                                    offset)
+                    else:
+                        copied = os.sendfile(fdst.fileno(),
+                                             fsrc.fileno(),
+                                             offset,
+                                             size - offset)
+
+                    if copied < 1:
+                        break
+
+                    offset += copied
+
+                if offset == size:
+                    return method
+            except OSError:
+                pass
+
+            fdst.seek(0)
+            fdst.truncate()
+
+    shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+
+    return 'read/write'
+
+def linkFile(src, dst):
+    # Clone the file in copy-on-write file systems, the copy will be
+    # independent from the source.
+    if sys.platform.startswith('linux') and fcntl:
+        try:
+            with open(src, 'rb') as fsrc:
+                with open(dst, 'wb') as fdst:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+            shutil.copymode(src, dst)
+
+            return 'reflink'
+        except OSError:
+            if os.path.lexists(dst):
+                os.remove(dst)
+
+    # Otherwise share the file, the files must be replaced instead of being
+    # modified in place.
+    try:
+        os.link(src, dst)
+
+        return 'hardlink'
+    except OSError:
+        pass
+
+    return ''
+
+def copyFile(src, dst, followSymlinks=True, hardlink=False):
+    method = ''
+    size = 0
+
+    if not followSymlinks and os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+        method = 'symlink'
+    elif hardlink:
+        size = os.path.getsize(src)
+        method = linkFile(src, dst)
+
+    if method == '':
+        with open(src, 'rb') as fsrc:
+            srcStat = os.fstat(fsrc.fileno())
+            size = srcStat.st_size
+
+            with open(dst, 'wb') as fdst:
+                method = copyFileContents(fsrc, fdst, size)
+
+        shutil.copymode(src, dst)
+
+    manifest = COPY_MANIFEST
+
+    if manifest is not None and method != 'symlink':
+        manifest.record(src, dst)
+
+    with COPY_STATS_MUTEX:
+        COPY_STATS['files'] += 1
+        COPY_STATS['bytes'] += size
+        COPY_STATS['methods'][method] = COPY_STATS['methods'].get(method, 0) + 1
+
+    return dst
+
+def stagingDir(outputDir):
+    # Create the scratch directory in the output directory, the files can
+    # be linked instead of copied if it's in the same file system as the
+    # data.
+    if os.path.isdir(outputDir) and os.access(outputDir, os.W_OK):
+        return tempfile.TemporaryDirectory(prefix='.staging-', dir=outputDir)
+
+    return tempfile.TemporaryDirectory()
+
+def walkEntries(path):
+    # Same as os.walk but returning the DirEntry objects, so the file type
+    # don't needs to be queried again.
+    dirs = []
+    files = []
+
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    isDir = entry.is_dir()
+                except OSError:
+                    isDir = False
+
+                if isDir:
+                    dirs.append(entry)
+                else:
+                    files.append(entry)
+    except OSError:
+        return
+
+    yield path, dirs, files
+
+    for entry in dirs:
+        if not entry.is_symlink():
+            yield from walkEntries(entry.path)
+
+def copy(src,
+         dst='.',
+         copyReals=False,
+         overwrite=True,
+         rootPath='',
+         hardlinks=False,
+         raiseErrors=False):
     if not os.path.exists(src):
+        if raiseErrors:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), src)
+
         return False
 
     if hostPlatform() == 'windows':
@@ -101,13 +427,22 @@ def copy(src, dst='.', copyReals=False, overwrite=True, rootPath=''):
             dstdirs = dst
             dstfile = os.path.join(dst, os.path.basename(src))
 
+        DTBinary.invalidateScans(dstfile)
+
         if not os.path.exists(dstdir):
             try:
-                os.makedirs(dstdir)
+                os.makedirs(dstdir, exist_ok=True)
             except:
+                if raiseErrors:
+                    raise
+
                 return False
 
         if overwrite or not os.path.exists(dstfile):
+            if (copyReals or not os.path.islink(src)) \
+                and isUnchanged(src, dstfile):
+                return True
+
             if os.path.exists(dstfile) or os.path.islink(dstfile):
                 os.remove(dstfile)
 
@@ -128,11 +463,17 @@ def copy(src, dst='.', copyReals=False, overwrite=True, rootPath=''):
                 try:
                     os.symlink(dstlink, dstfile)
                 except:
+                    if raiseErrors:
+                        raise
+
                     return False
             else:
                 try:
-                    shutil.copy(src, dstfile, follow_symlinks=copyReals)
+                    copyFile(src, dstfile, copyReals, hardlinks)
                 except:
+                    if raiseErrors:
+                        raise
+
                     return False
 
             if os.path.islink(src) and not copyReals:
@@ -141,7 +482,13 @@ def copy(src, dst='.', copyReals=False, overwrite=True, rootPath=''):
                 if rootPath != '':
                     dstfile = repositionPath(dstfile, rootPath)
 
-                if not copy(realsrc, dstfile, copyReals, overwrite, rootPath):
+                if not copy(realsrc,
+                            dstfile,
+                            copyReals,
+                            overwrite,
+                            rootPath,
+                            hardlinks,
+                            raiseErrors):
                     return False
 
         return True
@@ -149,14 +496,52 @@ def copy(src, dst='.', copyReals=False, overwrite=True, rootPath=''):
     if os.path.isfile(dst):
         return False
 
-    for root, dirs, files in os.walk(src):
+    DTBinary.invalidateScans(dst)
+
+    for root, dirs, files in walkEntries(src):
+        dstroot = os.path.join(dst, os.path.relpath(root, src))
+        dstrootExists = os.path.isdir(dstroot)
+
         for f in files:
-            srcfile = os.path.join(root, f)
-            relsrcfile = os.path.relpath(srcfile, src)
-            dstfile = os.path.join(dst, relsrcfile)
-            copy(srcfile, dstfile, copyReals, overwrite, rootPath)
+            srcfile = f.path
+            dstfile = os.path.normpath(os.path.join(dstroot, f.name))
+
+            if f.is_symlink() or not f.is_file():
+                copy(srcfile, dstfile, copyReals, overwrite, rootPath, hardlinks)
+
+                continue
+
+            # Regular files can be copied straight away.
+            if not dstrootExists:
+                try:
+                    os.makedirs(os.path.normpath(dstroot))
+                except:
+                    continue
+
+                dstrootExists = True
+
+            if not overwrite and os.path.exists(dstfile):
+                continue
+
+            if isUnchanged(srcfile, dstfile):
+                continue
+
+            try:
+                os.remove(dstfile)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                copy(srcfile, dstfile, copyReals, overwrite, rootPath, hardlinks)
+
+                continue
+
+            try:
+                copyFile(srcfile, dstfile, True, hardlinks)
+            except:
+                pass
 
         for d in dirs:
+            d = d.name
             srcdir = os.path.join(root, d)
             relsrcdir = os.path.relpath(srcdir, src)
             dstdir = os.path.join(dst, relsrcdir)
@@ -180,7 +565,7 @@ def copy(src, dst='.', copyReals=False, overwrite=True, rootPath=''):
 
             if os.path.islink(srcdir):
                 if copyReals:
-                    copy(srcdir, dstdir, copyReals, overwrite, rootPath)
+                    copy(srcdir, dstdir, copyReals, overwrite, rootPath, hardlinks)
                 else:
                     realsrcdir = realPath(srcdir)
                     relsrcdir = os.path.relpath(realsrcdir,
@@ -202,10 +587,18 @@ def move(src, dst='.', moveReals=False):
     if not os.path.exists(src):
         return False
 
+    # The moved binaries disappear from the source tree.
+    DTBinary.invalidateScans(src)
+    DTBinary.invalidateScans(dst)
+
     if os.path.isdir(src):
         if os.path.isfile(dst):
             return False
 
+        if not moveReals and not os.path.islink(src) and renameTree(src, dst):
+            return True
+
+        # Whatever couldn't be renamed is moved file by file.
         for root, dirs, files in os.walk(src):
             for f in files:
                 fromF = os.path.join(root, f)
@@ -258,6 +651,49 @@ def move(src, dst='.', moveReals=False):
 
     return True
 
+def renameTree(src, dst):
+    # Within the same file system the tree is moved by renaming it, or by
+    # renaming its entries into the destination if it already exists.
+    # Returns False if something is left to move, like entries in another
+    # file system or conflicting with the destination.
+    if not os.path.lexists(dst):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+            os.rename(src, dst)
+        except OSError:
+            return False
+
+        return True
+
+    if not os.path.isdir(dst) or os.path.islink(dst):
+        return False
+
+    moved = True
+
+    with os.scandir(src) as entries:
+        entries = list(entries)
+
+    for entry in entries:
+        target = os.path.join(dst, entry.name)
+
+        if entry.is_dir(follow_symlinks=False):
+            moved = renameTree(entry.path, target) and moved
+        elif os.path.isdir(target) and not os.path.islink(target):
+            moved = False
+        else:
+            try:
+                os.replace(entry.path, target)
+            except OSError:
+                moved = False
+
+    if moved:
+        try:
+            os.rmdir(src)
+        except OSError:
+            return False
+
+    return moved
+
 def sha256sum(fileName):
     sha = hashlib.sha256()
 
@@ -316,6 +752,67 @@ def numThreads():
 
     return nthreads
 
+def parallelMap(function, items, nthreads=0):
+    if nthreads < 1:
+        nthreads = numThreads()
+
+    # The items are iterated twice.
+    items = list(items)
+    results = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=nthreads) as executor:
+        futures = [executor.submit(function, item) for item in items]
+
+        # Results are returned in the same order as the items.
+        for item, future in zip(items, futures):
+            try:
+                results.append((item, future.result(), None))
+            except Exception as e:
+                results.append((item, None, e))
+
+    return results
+
+def orderedParallelMap(function, items, nthreads=0, weight=None, maxWeight=0):
+    # Same as parallelMap, but the results are yielded as soon as they are
+    # ready in the same order as the items, and only a bounded number of
+    # items are processed ahead. If maxWeight is given, the total weight of
+    # the items processed ahead is also bounded, an item heavier than that
+    # is processed alone.
+    if nthreads < 1:
+        nthreads = numThreads()
+
+    if nthreads < 2:
+        for item in items:
+            yield function(item)
+
+        return
+
+    pending = collections.deque()
+    pendingWeight = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=nthreads) as executor:
+        try:
+            for item in items:
+                itemWeight = weight(item) if weight else 0
+
+                while len(pending) >= 2 * nthreads \
+                    or (maxWeight > 0
+                        and len(pending) > 0
+                        and pendingWeight + itemWeight > maxWeight):
+                    future, futureWeight = pending.popleft()
+                    pendingWeight -= futureWeight
+
+                    yield future.result()
+
+                pending.append((executor.submit(function, item), itemWeight))
+                pendingWeight += itemWeight
+
+            while len(pending) > 0:
+                yield pending.popleft()[0].result()
+        finally:
+            for future, _ in pending:
+                future.cancel()
+
 def programVersion(configs, sourcesDir):
     if 'DAILY_BUILD' in os.environ:
         branch = ''
@@ -356,15 +853,22 @@ def solvedepsLibs(globs,
     if not 'dependencies' in globs:
         globs['dependencies'] = set()
 
-    deps = set(solver.scanDependencies(dataDir))
+    # Only the libraries required by the binaries added since the last call
+    # have to be copied.
+    index = DTBinary.scanIndex(globs)
+    graph = index.dependencyGraph(solver, dataDir)
+    deps, newDeps = index.delta(solver, dataDir, 'solvedepsLibs')
+    deps = set(deps)
+    newDeps = set(newDeps)
 
     if mainExecutable != '':
         for dep in extraLibs:
             path = solver.guess(mainExecutable, dep)
 
             if path != '':
-                deps.add(path)
-                deps.update(solver.allDependencies(path))
+                extraDeps = {path} | solver.allDependencies(path, graph)
+                deps.update(extraDeps)
+                newDeps.update(extraDeps)
 
     deps = sorted(deps)
     depsInstallDir = ''
@@ -374,28 +878,93 @@ def solvedepsLibs(globs,
     else:
         depsInstallDir = libDir
 
+    copies = []
+
     for dep in deps:
+        isNew = dep in newDeps
         dep = dep.replace('\\', '/')
         depPath = os.path.join(depsInstallDir, os.path.basename(dep))
         depPath = depPath.replace('\\', '/')
 
+        if not isNew and os.path.lexists(depPath):
+            continue
+
         if dep != depPath:
             if hostPlatform() == 'windows':
                 dep = dep.replace('/', '\\')
                 depPath = depPath.replace('/', '\\')
 
-            print('    {} -> {}'.format(dep, depPath))
+            copies.append((dep, depPath))
 
-            if hostPlatform() == 'mac' and dep.endswith('.framework'):
-                DTMac.copyBundle(dep, depPath)
-            else:
-                copyReals = targetPlatform == 'windows'
-                copy(dep, depPath, copyReals, True, dataDir)
+    copyReals = targetPlatform == 'windows'
 
+    def copyDependency(dep, depPath):
+        if hostPlatform() == 'mac' and dep.endswith('.framework'):
+            DTMac.copyBundle(dep, depPath)
+        else:
+            copy(dep, depPath, copyReals, True, dataDir, raiseErrors=True)
+
+    def copyGroup(group):
+        errors = {}
+
+        for dep, depPath in group:
+            try:
+                copyDependency(dep, depPath)
+            except Exception as e:
+                errors[dep] = e
+
+        return errors
+
+    errors = {}
+
+    for _, groupErrors, error in parallelMap(copyGroup,
+                                             dependencyCopyGroups(copies),
+                                             numThreads() * 2):
+        if error:
+            raise error
+
+        errors.update(groupErrors)
+
+    for dep, depPath in copies:
+        print('    {} -> {}'.format(dep, depPath))
+
+        if dep in errors:
+            print('        Failed to copy dependency: {}'.format(errors[dep]))
+        else:
             globs['dependencies'].add(dep)
 
     globs['libs'] = set(deps)
 
+def dependencyCopyGroups(copies):
+    # Copies that can write to the same destination file, either the library
+    # itself or the target of its symlink, must be done in order by the same
+    # worker, so the last one wins as when copying them one by one.
+    keys = {}
+    parents = list(range(len(copies)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+
+        return i
+
+    for i, (dep, depPath) in enumerate(copies):
+        for name in {os.path.basename(dep), os.path.basename(realPath(dep))}:
+            key = os.path.normcase(name)
+
+            if key in keys:
+                parents[find(i)] = find(keys[key])
+            else:
+                keys[key] = i
+
+    groups = {}
+
+    for i, item in enumerate(copies):
+        groups.setdefault(find(i), []).append(item)
+
+    return [groups[i] for i in sorted(groups)]
+
 def pathSize(path):
     if os.path.isfile(path):
         return os.path.getsize(path)
@@ -93,7 +93,8 @@ def copyVlcPlugins(globs,
     else:
         vlcLibName = 'vlc'
 
-    for dep in solver.scanDependencies(dataDir):
+    for dep in solver.scanDependencies(dataDir,
+                                       index=DTBinary.scanIndex(globs)):
         libName = solver.name(dep)
 
         if libName == vlcLibName:
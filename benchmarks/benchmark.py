@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2021  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+# Benchmarks of the deploy tools. Every benchmark runs against the working
+# tree, and optionally against another git revision to compare both.
+#
+#     python benchmarks/benchmark.py elf -r <revision> [-d /usr/lib]
+#     python benchmarks/benchmark.py zip -r <revision> [-d <data dir>]
+
+import configparser
+import hashlib
+import io
+import json
+import optparse
+import os
+import subprocess # nosec
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def listElfLibraries(libDir):
+    from WebcamoidDeployTools import DTBinaryElf
+
+    libraries = []
+
+    for root, _, files in os.walk(libDir):
+        for f in files:
+            path = os.path.join(root, f)
+
+            if '.so' in f \
+                and not os.path.islink(path) \
+                and DTBinaryElf.isValid(path):
+                libraries.append(path)
+
+    return sorted(libraries)
+
+def benchmarkElf(options):
+    from WebcamoidDeployTools import DTBinaryElf
+
+    libraries = listElfLibraries(options.data_dir or '/usr/lib')
+    results = hashlib.sha256()
+    startTime = time.perf_counter()
+
+    for library in libraries:
+        try:
+            info = DTBinaryElf.dump(library)
+        except Exception:
+            info = {}
+
+        # Sets have no stable order between interpreters.
+        info = {key: sorted(value) if isinstance(value, (set, list)) else value
+                for key, value in info.items()}
+        results.update(repr(sorted(info.items())).encode())
+
+    return {'seconds': time.perf_counter() - startTime,
+            'files': len(libraries),
+            'bytes': sum([os.path.getsize(library) for library in libraries]),
+            'results': results.hexdigest()}
+
+def benchmarkZip(options):
+    from WebcamoidDeployTools import DTCompressedZip
+
+    dataDir = options.data_dir \
+              or os.path.dirname(os.path.abspath(os.__file__))
+    configs = configparser.ConfigParser()
+    configs.read_dict({'Package': {'name': 'app',
+                                   'version': '1.0.0',
+                                   'targetPlatform': 'posix',
+                                   'targetArch': 'x86_64'}})
+    globs = {}
+
+    with tempfile.TemporaryDirectory() as outputDir:
+        startTime = time.perf_counter()
+        DTCompressedZip.run(globs,
+                            configs,
+                            dataDir,
+                            outputDir,
+                            threading.Lock())
+        seconds = time.perf_counter() - startTime
+        package = globs['outputPackages'][0]
+        results = hashlib.sha256()
+
+        # Compare the contents only, the compression may differ.
+        with zipfile.ZipFile(package) as zipFile:
+            files = sorted(zinfo.filename
+                           for zinfo in zipFile.infolist()
+                           if not zinfo.is_dir())
+
+            for f in files:
+                results.update(f.encode())
+                results.update(hashlib.sha256(zipFile.read(f)).digest())
+
+        return {'seconds': seconds,
+                'files': len(files),
+                'size': os.path.getsize(package),
+                'results': results.hexdigest()}
+
+BENCHMARKS = {'elf': benchmarkElf,
+              'zip': benchmarkZip}
+
+def runBenchmark(sourcesDir, benchmark, args):
+    # Run the benchmark in a new interpreter, so the modules of every revision
+    # are imported only once.
+    env = os.environ.copy()
+    env['PYTHONPATH'] = sourcesDir
+    process = subprocess.run([sys.executable, # nosec
+                              os.path.abspath(__file__),
+                              '--worker',
+                              benchmark] + args,
+                             stdout=subprocess.PIPE,
+                             check=True,
+                             cwd=sourcesDir,
+                             env=env)
+
+    return json.loads(process.stdout)
+
+def extractRevision(revision, outputDir):
+    process = subprocess.run(['git', 'archive', revision, 'WebcamoidDeployTools'], # nosec
+                             stdout=subprocess.PIPE,
+                             check=True,
+                             cwd=ROOT_DIR)
+
+    with tarfile.open(fileobj=io.BytesIO(process.stdout)) as tar:
+        tar.extractall(outputDir)
+
+def printResult(label, result):
+    print('{}:'.format(label))
+
+    for key in sorted(result):
+        if isinstance(result[key], float):
+            print('    {}: {:.3f}'.format(key, result[key]))
+        else:
+            print('    {}: {}'.format(key, result[key]))
+
+if __name__ =='__main__':
+    usage = """%prog [options] {}""".format('|'.join(sorted(BENCHMARKS)))
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option('-r',
+                      '--reference',
+                      action='store',
+                      type='string',
+                      dest='reference',
+                      help='Git revision to compare with.',
+                      default='')
+    parser.add_option('-d',
+                      '--data',
+                      action='store',
+                      type='string',
+                      dest='data_dir',
+                      help='Directory with the input data of the benchmark.',
+                      default='')
+    parser.add_option('--worker',
+                      action='store_true',
+                      dest='worker',
+                      help=optparse.SUPPRESS_HELP)
+    options, args = parser.parse_args()
+
+    if len(args) != 1 or not args[0] in BENCHMARKS:
+        parser.print_help()
+        exit(-1)
+
+    if options.worker:
+        print(json.dumps(BENCHMARKS[args[0]](options)))
+        exit()
+
+    benchmarkArgs = []
+
+    if options.data_dir != '':
+        benchmarkArgs += ['-d', os.path.abspath(options.data_dir)]
+
+    current = runBenchmark(ROOT_DIR, args[0], benchmarkArgs)
+    printResult('Working tree', current)
+
+    if options.reference != '':
+        with tempfile.TemporaryDirectory() as referenceDir:
+            extractRevision(options.reference, referenceDir)
+            reference = runBenchmark(referenceDir, args[0], benchmarkArgs)
+
+        printResult(options.reference, reference)
+        print('Speedup: {:.2f}x'.format(reference['seconds'] / current['seconds']))
+
+        if 'results' in current:
+            print('Same results: {}'.format(current['results'] == reference['results']))
@@ -19,7 +19,10 @@
 #
 # Web-Site: http://webcamoid.github.io/
 
+import concurrent.futures
+import copy
 import importlib
+import multiprocessing
 import optparse
 import os
 import platform
@@ -27,7 +30,9 @@ import sys
 import threading
 
 from WebcamoidDeployTools import DTUtils
+from WebcamoidDeployTools import DTArchive
 from WebcamoidDeployTools import DTBinary
+from WebcamoidDeployTools import DTScheduler
 
 
 if __name__ =='__main__':
@@ -68,6 +73,11 @@ if __name__ =='__main__':
                       action='store_true',
                       dest='package_only',
                       help='Just package the data.')
+    parser.add_option('-f',
+                      '--force',
+                      action='store_true',
+                      dest='force',
+                      help='Overwrite all files while preparing the data, even if they did not changed.')
     options, args = parser.parse_args()
 
     if len(options.data_dir) < 1 or len(options.config_file) < 1:
@@ -96,8 +106,28 @@ if __name__ =='__main__':
     targetPlatform = configs.get('Package', 'targetPlatform', fallback='').strip()
     targetArch = configs.get('Package', 'targetArch', fallback='').strip()
     sourcesDir = configs.get('Package', 'sourcesDir', fallback='.').strip()
+    depsCacheDir = configs.get('System', 'depsCacheDir', fallback='').strip()
+    depsCacheHash = configs.get('System', 'depsCacheHash', fallback='false').strip()
+    depsCacheHash = DTUtils.toBool(depsCacheHash)
+    excludeLists = configs.get('System', 'excludeLists', fallback='')
+    incrementalCopyHash = configs.get('System', 'incrementalCopyHash', fallback='false').strip()
+    incrementalCopyHash = DTUtils.toBool(incrementalCopyHash)
+    packagingThreads = configs.get('System', 'packagingThreads', fallback='0').strip()
+    packagingThreads = DTUtils.toInt(packagingThreads)
+    # The history of the packaging jobs is kept with the dependencies
+    # cache, the scheduler works without it.
+    defaultPackagingHistory = ''
+
+    if depsCacheDir != '':
+        defaultPackagingHistory = os.path.join(depsCacheDir, 'packaging-history.json')
+
+    packagingHistory = configs.get('System', 'packagingHistory', fallback=defaultPackagingHistory).strip()
     globs = {}
 
+    if excludeLists != '':
+        for excludeList in excludeLists.split(','):
+            DTBinary.addExcludeList(os.path.join(sourcesDir, excludeList.strip()))
+
     print('Build info')
     print()
     print('Python version:', platform.python_version())
@@ -110,6 +140,10 @@ if __name__ =='__main__':
     print('Target architecture:', targetArch)
     print('Number of threads:', DTUtils.numThreads())
     print('Program version:', DTUtils.programVersion(configs, sourcesDir))
+
+    if depsCacheDir != '':
+        print('Dependencies cache directory:', depsCacheDir)
+
     print()
 
     if options.prepare_only or \
@@ -123,6 +157,14 @@ if __name__ =='__main__':
 
         modules.append(targetPlatform.capitalize())
 
+        # The copies are tracked only if there is a cache directory.
+        if depsCacheDir != '':
+            DTBinary.binaryCache.openStore(depsCacheDir, depsCacheHash)
+            DTUtils.openCopyManifest(DTUtils.copyManifestPath(depsCacheDir,
+                                                              options.data_dir),
+                                     incrementalCopyHash,
+                                     not options.force)
+
         for module in modules:
             print('Running {} module pre-processing'.format(module))
             print()
@@ -135,7 +177,28 @@ if __name__ =='__main__':
             mod = importlib.import_module('WebcamoidDeployTools.DT' + module)
             mod.postRun(globs, configs, options.data_dir)
 
+        DTBinary.binaryCache.closeStore()
+        cacheStats = DTBinary.binaryCache.stats()
+        print('Binary cache: {} hits, {} stored hits, {} misses'.format(cacheStats['hits'],
+                                                                        cacheStats['storeHits'],
+                                                                        cacheStats['misses']))
+
+        if 'scanIndex' in globs:
+            scanIndex = globs['scanIndex']
+            print('Dependency scans: {}, {} of them looked at written files, {} binaries resolved'.format(scanIndex.scans,
+                                                                                                           scanIndex.rescans,
+                                                                                                           scanIndex.resolved))
+
+        copyStats = DTUtils.copyStats()
+        print('Copied files: {} ({} bytes), unchanged files skipped: {}'.format(copyStats['files'],
+                                                                               copyStats['bytes'],
+                                                                               copyStats['skipped']))
+
+        for method in sorted(copyStats['methods']):
+            print('    {}: {}'.format(method, copyStats['methods'][method]))
+
         print()
+        DTUtils.closeCopyManifest()
 
     if options.package_only or \
         (not options.prepare_only and not options.package_only):
@@ -170,6 +233,13 @@ if __name__ =='__main__':
         else:
             outputFormats = [fmt.strip() for fmt in outputFormats.split(',')]
 
+        processFormats = configs.get('Package', 'processFormats', fallback='')
+
+        if processFormats == '':
+            processFormats = []
+        else:
+            processFormats = [fmt.strip() for fmt in processFormats.split(',')]
+
         packagingTools = []
 
         for format in outputFormats:
@@ -188,22 +258,108 @@ if __name__ =='__main__':
                 os.makedirs(options.output_dir)
 
             mutex = threading.Lock()
-            threads = []
 
-            for format in packagingTools:
-                mod = importlib.import_module('WebcamoidDeployTools.DT' + format)
-                threads.append(threading.Thread(target=mod.run,
-                                                args=(globs,
-                                                      configs,
-                                                      options.data_dir,
-                                                      options.output_dir,
-                                                      mutex,)))
+            # The CPU bound formats can run in their own process, so they
+            # don't compete for the interpreter lock with the other formats.
+            processFormats = [format for format in packagingTools
+                              if format in processFormats]
+            processPool = None
+
+            if len(processFormats) > 0:
+                print('Formats running in separated processes: {}'.format(', '.join(processFormats)))
+                print()
+                poolOptions = {'max_workers': len(processFormats),
+                               'mp_context': multiprocessing.get_context('spawn')}
+
+                # Use a new process for every format to measure its memory,
+                # requires Python 3.11 or newer.
+                if sys.version_info >= (3, 11):
+                    poolOptions['max_tasks_per_child'] = 1
+
+                processPool = concurrent.futures.ProcessPoolExecutor(**poolOptions)
+
+            # Read the data directory only once for all the archive formats.
+            dataTreeFormats = [format for format in packagingTools
+                               if format in DTArchive.DATA_TREE_FORMATS
+                               and not format in processFormats]
+            dataTree = None
+
+            if len(dataTreeFormats) > 1:
+                name = configs.get('Package', 'name', fallback='app').strip()
+                dataTree = DTArchive.DataTreeStream(options.data_dir,
+                                                    name,
+                                                    dataTreeFormats,
+                                                    DTArchive.dataClassifier(configs))
+                globs['dataTree'] = dataTree
+
+            def runFormat(format, threads):
+                # Give the format the threads assigned by the scheduler,
+                # unless they were configured.
+                formatConfigs = copy.deepcopy(configs)
+
+                if not formatConfigs.has_section(format):
+                    formatConfigs.add_section(format)
+
+                if not formatConfigs.has_option(format, 'threads'):
+                    formatConfigs.set(format, 'threads', str(threads))
+
+                # The memory used is only known for the formats running in
+                # their own process.
+                rss = 0
+
+                try:
+                    if format in processFormats:
+                        result = processPool.submit(DTScheduler.runFormat,
+                                                    format,
+                                                    formatConfigs,
+                                                    options.data_dir,
+                                                    options.output_dir).result()
+                        DTArchive.mergeCodecsStats(result['codecsStats'])
+                        mutex.acquire()
+
+                        if not 'outputPackages' in globs:
+                            globs['outputPackages'] = []
+
+                        globs['outputPackages'] += result['outputPackages']
+                        mutex.release()
+                        rss = result['peakRss']
+                    else:
+                        mod = importlib.import_module('WebcamoidDeployTools.DT' + format)
+                        mod.run(globs,
+                                formatConfigs,
+                                options.data_dir,
+                                options.output_dir,
+                                mutex)
+                finally:
+                    if dataTree:
+                        dataTree.detach(format)
+
+                return rss
+
+            if dataTree:
+                dataTree.start()
+
+            project = '{}-{}-{}'.format(configs.get('Package', 'name', fallback='app').strip(),
+                                        targetPlatform,
+                                        targetArch)
+            history = DTScheduler.JobHistory(packagingHistory, project)
+            jobs = DTScheduler.packagingJobs(packagingTools,
+                                             [dataTreeFormats] if dataTree else [],
+                                             history)
+            DTScheduler.runJobs(jobs,
+                                runFormat,
+                                history,
+                                packagingThreads,
+                                DTScheduler.availableMemory())
+            print()
+            history.save()
 
-            for thread in threads:
-                thread.start()
+            if processPool:
+                processPool.shutdown()
 
-            for thread in threads:
-                thread.join()
+            if dataTree:
+                dataTree.join()
+                del globs['dataTree']
 
             if 'outputPackages' in globs and len(globs['outputPackages']) > 0:
                 print('Packages created:')
@@ -212,6 +368,13 @@ if __name__ =='__main__':
                     print('   ', os.path.basename(package), DTUtils.hrSize(os.path.getsize(package)))
                     print('        md5sum:', DTUtils.md5sum(package))
 
+                classifierStats = DTArchive.classifierStats()
+
+                if classifierStats['storedBytes'] > 0:
+                    print()
+                    print('Incompressible data stored: {} ({} files), estimated compression time saved: {:.2f}s'.format(DTUtils.hrSize(classifierStats['storedBytes']),
+                                                                                                                        classifierStats['storedFiles'],
+                                                                                                                        classifierStats['savedTime']))
             else:
                 print('No packages were created')
         else:
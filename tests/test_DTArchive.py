@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2021  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import builtins
+import bz2
+import gzip
+import io
+import lzma
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import unittest
+import unittest.mock
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WebcamoidDeployTools import DTArchive
+
+
+class TestWriteZip(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.dataDir = os.path.join(self.tmpDir, 'data')
+        os.makedirs(os.path.join(self.dataDir, 'share', 'docs'))
+        os.makedirs(os.path.join(self.dataDir, 'bin'))
+
+        with open(os.path.join(self.dataDir, 'share', 'docs', 'text'), 'w') as f:
+            f.write('\n'.join(str(i) for i in range(10000)))
+
+        with open(os.path.join(self.dataDir, 'bin', 'random'), 'wb') as f:
+            f.write(os.urandom(100000))
+
+        os.symlink(os.path.join('..', 'share', 'docs', 'text'),
+                   os.path.join(self.dataDir, 'bin', 'link'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def writeZip(self, fileName, **kwargs):
+        path = os.path.join(self.tmpDir, fileName)
+        DTArchive.writeZip(path, self.dataDir, 'app', **kwargs)
+
+        return path
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def testContents(self):
+        path = self.writeZip('app.zip')
+
+        with zipfile.ZipFile(path) as zipFile:
+            self.assertIsNone(zipFile.testzip())
+            self.assertEqual(zipFile.namelist(),
+                             ['app/bin/',
+                              'app/bin/link',
+                              'app/bin/random',
+                              'app/share/',
+                              'app/share/docs/',
+                              'app/share/docs/text'])
+            text = self.read(os.path.join(self.dataDir, 'share', 'docs', 'text'))
+
+            # Symlinks are followed by default.
+            self.assertEqual(zipFile.read('app/bin/link'), text)
+            self.assertEqual(zipFile.read('app/share/docs/text'), text)
+            self.assertEqual(zipFile.read('app/bin/random'),
+                             self.read(os.path.join(self.dataDir, 'bin', 'random')))
+
+    def testReproducible(self):
+        self.assertEqual(self.read(self.writeZip('app1.zip', threads=4)),
+                         self.read(self.writeZip('app2.zip', threads=1)))
+
+    def testSpooledEntries(self):
+        # Files compressed in memory and through a spool give the same zip.
+        self.assertEqual(self.read(self.writeZip('app1.zip')),
+                         self.read(self.writeZip('app2.zip',
+                                                 memorySize=0,
+                                                 maxPendingSize=1)))
+
+    def testStoreSymlinks(self):
+        path = self.writeZip('app.zip', storeSymlinks=True)
+
+        with zipfile.ZipFile(path) as zipFile:
+            zinfo = zipFile.getinfo('app/bin/link')
+            self.assertEqual(zinfo.external_attr >> 28, 0o12)
+            self.assertEqual(zipFile.read(zinfo), b'../share/docs/text')
+
+    def testZip64(self):
+        zipLimit = DTArchive.ZIP_LIMIT
+        zipCountLimit = DTArchive.ZIP_COUNT_LIMIT
+
+        # Pretend the archive is too big for the classic records.
+        try:
+            DTArchive.ZIP_LIMIT = 1024
+            DTArchive.ZIP_COUNT_LIMIT = 2
+            path = self.writeZip('app.zip')
+        finally:
+            DTArchive.ZIP_LIMIT = zipLimit
+            DTArchive.ZIP_COUNT_LIMIT = zipCountLimit
+
+        with zipfile.ZipFile(path) as zipFile:
+            self.assertIsNone(zipFile.testzip())
+            self.assertEqual(len(zipFile.namelist()), 6)
+            self.assertEqual(zipFile.read('app/bin/random'),
+                             self.read(os.path.join(self.dataDir, 'bin', 'random')))
+
+class TestDataClassifier(unittest.TestCase):
+    def testClassify(self):
+        classifier = DTArchive.DataClassifier()
+
+        self.assertTrue(classifier.isCompressible(b'0123456789' * 10000))
+        self.assertFalse(classifier.isCompressible(os.urandom(100000)))
+
+    def testSmallFilesNotChecked(self):
+        classifier = DTArchive.DataClassifier(minSize=1024)
+
+        self.assertFalse(classifier.isWorthChecking(1023))
+        self.assertTrue(classifier.isWorthChecking(1024))
+
+class TestAddTree(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.dataDir = os.path.join(self.tmpDir, 'data')
+        os.makedirs(os.path.join(self.dataDir, 'bin'))
+        os.makedirs(os.path.join(self.dataDir, 'share'))
+        self.text = '\n'.join(str(i) for i in range(100000)).encode()
+        self.random = os.urandom(200000)
+
+        with open(os.path.join(self.dataDir, 'bin', 'random'), 'wb') as f:
+            f.write(self.random)
+
+        with open(os.path.join(self.dataDir, 'share', 'text'), 'wb') as f:
+            f.write(self.text)
+
+        os.link(os.path.join(self.dataDir, 'share', 'text'),
+                os.path.join(self.dataDir, 'share', 'link'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testIncompressibleFilesLast(self):
+        data = io.BytesIO()
+        opened = []
+        builtinOpen = builtins.open
+
+        def trackOpen(path, *args, **kwargs):
+            opened.append(os.path.basename(path))
+
+            return builtinOpen(path, *args, **kwargs)
+
+        with unittest.mock.patch('builtins.open', trackOpen):
+            with tarfile.open(fileobj=data, mode='w') as tar:
+                DTArchive.addTree(tar,
+                                  self.dataDir,
+                                  'app',
+                                  DTArchive.DataClassifier())
+
+        # The compressible files are read just once, and the hardlinks to
+        # them not at all.
+        self.assertEqual(opened.count('link'), 1)
+        self.assertNotIn('text', opened)
+
+        data.seek(0)
+
+        with tarfile.open(fileobj=data, mode='r') as tar:
+            self.assertEqual(tar.getnames(),
+                             ['app',
+                              'app/bin',
+                              'app/share',
+                              'app/share/link',
+                              'app/share/text',
+                              'app/bin/random'])
+            self.assertTrue(tar.getmember('app/share/text').islnk())
+            self.assertEqual(tar.extractfile('app/share/text').read(), self.text)
+            self.assertEqual(tar.extractfile('app/bin/random').read(), self.random)
+
+class TestParallelCompressWriter(unittest.TestCase):
+    BLOCK_SIZE = 64 * 1024
+
+    def setUp(self):
+        self.data = '\n'.join(str(i) for i in range(50000)).encode()
+        DTArchive.resetCodecsStats()
+
+    def tearDown(self):
+        DTArchive.resetCodecsStats()
+
+    def sizes(self):
+        # Empty, exactly one block, one block and a byte, and several blocks.
+        return [0, self.BLOCK_SIZE, self.BLOCK_SIZE + 1, len(self.data)]
+
+    def compress(self, data, compress, threads, writerClass=None, **kwargs):
+        writerClass = writerClass or DTArchive.ParallelCompressWriter
+        output = io.BytesIO()
+
+        with writerClass(output,
+                         compress,
+                         self.BLOCK_SIZE,
+                         threads,
+                         **kwargs) as writer:
+            # Write in chunks that don't match the block size.
+            for i in range(0, len(data), 10000):
+                writer.write(data[i: i + 10000])
+
+            self.assertEqual(writer.tell(), len(data))
+
+        return output.getvalue()
+
+    def testGzip(self):
+        for threads in [1, 4]:
+            for size in self.sizes():
+                data = self.data[: size]
+                compressed = self.compress(data,
+                                           DTArchive.gzipBlock(6),
+                                           threads)
+                self.assertEqual(gzip.decompress(compressed), data)
+
+    def testBzip2(self):
+        for threads in [1, 4]:
+            for size in self.sizes():
+                data = self.data[: size]
+                compressed = self.compress(data,
+                                           DTArchive.bzip2Block(9),
+                                           threads)
+                self.assertEqual(bz2.decompress(compressed), data)
+
+    def testXz(self):
+        dictSize = DTArchive.xzDictSize(6, self.BLOCK_SIZE)
+
+        for preset in [0, 6, 6 | lzma.PRESET_EXTREME]:
+            for threads in [1, 4]:
+                for size in self.sizes():
+                    data = self.data[: size]
+                    compressed = self.compress(data,
+                                               DTArchive.xzBlock(preset,
+                                                                 dictSize),
+                                               threads,
+                                               DTArchive.XzWriter)
+                    self.assertEqual(lzma.decompress(compressed), data)
+
+    def testReproducible(self):
+        compress = DTArchive.xzBlock(6, DTArchive.xzDictSize(6, self.BLOCK_SIZE))
+        self.assertEqual(self.compress(self.data, compress, 1, DTArchive.XzWriter),
+                         self.compress(self.data, compress, 4, DTArchive.XzWriter))
+
+    def testStoredBlocks(self):
+        # Incompressible blocks go through storeCompress.
+        data = os.urandom(2 * self.BLOCK_SIZE) + self.data
+
+        for threads in [1, 4]:
+            DTArchive.resetCodecsStats()
+            compressed = self.compress(data,
+                                       DTArchive.gzipBlock(9),
+                                       threads,
+                                       storeCompress=DTArchive.gzipBlock(0),
+                                       classifier=DTArchive.DataClassifier(),
+                                       codec='gzip')
+            self.assertEqual(gzip.decompress(compressed), data)
+            stats = DTArchive.codecsStats()['gzip']
+            self.assertEqual(stats['storedBytes'], 2 * self.BLOCK_SIZE)
+            self.assertEqual(stats['compressedBytes'],
+                             len(data) - 2 * self.BLOCK_SIZE)
+
+    def testXzStoredBlocks(self):
+        data = os.urandom(2 * self.BLOCK_SIZE) + self.data
+        dictSize = DTArchive.xzDictSize(6, self.BLOCK_SIZE)
+        compressed = self.compress(data,
+                                   DTArchive.xzBlock(6, dictSize),
+                                   4,
+                                   DTArchive.XzWriter,
+                                   storeCompress=DTArchive.xzBlock(0, dictSize),
+                                   classifier=DTArchive.DataClassifier(),
+                                   codec='xz')
+        self.assertEqual(lzma.decompress(compressed), data)
+        self.assertEqual(DTArchive.codecsStats()['xz']['storedBytes'],
+                         2 * self.BLOCK_SIZE)
+
+    @unittest.skipIf(shutil.which('xz') is None, 'xz not available')
+    def testXzIntegrity(self):
+        dictSize = DTArchive.xzDictSize(6, self.BLOCK_SIZE)
+
+        for size in self.sizes():
+            compressed = self.compress(self.data[: size],
+                                       DTArchive.xzBlock(6, dictSize),
+                                       4,
+                                       DTArchive.XzWriter)
+            process = subprocess.run(['xz', '-t', '-'],
+                                     input=compressed,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+            self.assertEqual(process.returncode,
+                             0,
+                             process.stderr.decode(errors='replace'))
+
+
+if __name__ == '__main__':
+    unittest.main()
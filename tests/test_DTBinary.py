@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2021  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WebcamoidDeployTools import DTBinary
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'fixtures')
+
+class TestSubpaths(unittest.TestCase):
+    def testSubpaths(self):
+        paths = sorted(['/a',
+                        '/a-b/c',
+                        '/a/b',
+                        '/a/b/c',
+                        '/ab',
+                        '/b/a'])
+        self.assertEqual(sorted(DTBinary.subpaths(paths, '/a')),
+                         ['/a', '/a/b', '/a/b/c'])
+        self.assertEqual(DTBinary.subpaths(paths, '/a/b/c'), ['/a/b/c'])
+        self.assertEqual(DTBinary.subpaths(paths, '/a/c'), [])
+        self.assertEqual(DTBinary.subpaths(paths, '/'), paths)
+
+        for root in ['/a', '/a/b', '/a-b', '/b', '/c', '/']:
+            self.assertEqual(sorted(DTBinary.subpaths(paths, root)),
+                             [path for path in paths
+                              if DTBinary.isSubpath(path, root)])
+
+class TestScanIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.dataDir = os.path.join(self.tmpDir, 'data')
+        os.makedirs(os.path.join(self.dataDir, 'bin'))
+
+        # The app looks for libfoo in $ORIGIN/../lib.
+        shutil.copy(os.path.join(FIXTURES_DIR, 'app'),
+                    os.path.join(self.dataDir, 'bin', 'app'))
+        self.tools = DTBinary.BinaryTools('posix', 'posix', 'x86_64', [])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testLibraryAddedToSearchDir(self):
+        index = DTBinary.ScanIndex()
+        binDir = os.path.join(self.dataDir, 'bin')
+        libDir = os.path.join(self.dataDir, 'lib')
+        lib = os.path.join(libDir, 'libfoo.so.1')
+        self.assertNotIn(lib, index.scan(self.tools, binDir))
+
+        # Only the lib directory is written, the app was scanned before.
+        os.makedirs(libDir)
+        shutil.copy(os.path.join(FIXTURES_DIR, 'libfoo.so.1'), lib)
+        index.invalidate(libDir)
+
+        self.assertIn(lib, index.scan(self.tools, binDir))
+
+    def testUnchangedSearchDirs(self):
+        index = DTBinary.ScanIndex()
+        binDir = os.path.join(self.dataDir, 'bin')
+        deps = index.scan(self.tools, binDir)
+        resolved = index.resolved
+
+        self.assertEqual(index.scan(self.tools, binDir), deps)
+        self.assertEqual(index.resolved, resolved)
+
+    def testSearchDirsStatedOncePerScan(self):
+        libDir = os.path.join(self.dataDir, 'lib')
+        os.makedirs(libDir)
+        shutil.copy(os.path.join(FIXTURES_DIR, 'libfoo.so.1'), libDir)
+        shutil.copy(os.path.join(self.dataDir, 'bin', 'app'),
+                    os.path.join(self.dataDir, 'bin', 'app2'))
+        index = DTBinary.ScanIndex()
+        stated = []
+        dirState = DTBinary.dirState
+
+        def trackDirState(path):
+            stated.append(path)
+
+            return dirState(path)
+
+        with unittest.mock.patch.object(DTBinary, 'dirState', trackDirState):
+            deps = index.scan(self.tools, self.dataDir)
+            self.assertIn(os.path.join(libDir, 'libfoo.so.1'), deps)
+            self.assertIn(libDir, stated)
+            self.assertEqual(len(stated), len(set(stated)))
+
+            # The cached dependencies are checked against the same states.
+            stated.clear()
+            index.invalidate(os.path.join(self.dataDir, 'bin', 'app2'))
+            index.scan(self.tools, self.dataDir)
+            self.assertEqual(len(stated), len(set(stated)))
+
+class TestBinaryCacheStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.tmpDir, 'cache')
+        self.dataDir = os.path.join(self.tmpDir, 'data')
+        os.makedirs(os.path.join(self.dataDir, 'bin'))
+        self.app = os.path.join(self.dataDir, 'bin', 'app')
+        shutil.copy(os.path.join(FIXTURES_DIR, 'app'), self.app)
+        self.tools = DTBinary.BinaryTools('posix', 'posix', 'x86_64', [])
+
+    def tearDown(self):
+        DTBinary.binaryCache.closeStore()
+        DTBinary.binaryCache.clear()
+        shutil.rmtree(self.tmpDir)
+
+    def warmRun(self):
+        # A new run starts with an empty memory cache.
+        DTBinary.binaryCache.closeStore()
+        DTBinary.binaryCache.clear()
+        DTBinary.binaryCache.openStore(self.cacheDir)
+
+        return self.tools.dependencies(self.app)
+
+    def testStoredDependencies(self):
+        deps = self.warmRun()
+        self.assertEqual(DTBinary.binaryCache.stats()['storeHits'], 0)
+
+        self.assertEqual(self.warmRun(), deps)
+        self.assertGreater(DTBinary.binaryCache.stats()['storeHits'], 0)
+        self.assertEqual(DTBinary.binaryCache.stats()['misses'],
+                         DTBinary.binaryCache.stats()['storeHits'])
+
+    def testSearchDirChangedBetweenRuns(self):
+        libDir = os.path.join(self.dataDir, 'lib')
+        lib = os.path.join(libDir, 'libfoo.so.1')
+        self.assertNotIn(lib, self.warmRun())
+
+        os.makedirs(libDir)
+        shutil.copy(os.path.join(FIXTURES_DIR, 'libfoo.so.1'), lib)
+
+        self.assertIn(lib, self.warmRun())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2021  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import json
+import os
+import shutil
+import struct
+import subprocess # nosec
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WebcamoidDeployTools import DTBinaryElf
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'fixtures')
+
+# Entries are (soname, path, flags, hwcap).
+def writeLdsoCache(path, entries):
+    NEW_MAGIC = b'glibc-ld.so.cache1.1'
+    NEW_HEADER_SIZE = 48
+    NEW_ENTRY_SIZE = 24
+    stringsStart = NEW_HEADER_SIZE + len(entries) * NEW_ENTRY_SIZE
+    strings = b''
+    table = b''
+
+    for soname, libPath, flags, hwcap in entries:
+        key = stringsStart + len(strings)
+        strings += soname.encode() + b'\0'
+        value = stringsStart + len(strings)
+        strings += libPath.encode() + b'\0'
+        table += struct.pack('<iIIIQ', flags, key, value, 0, hwcap)
+
+    header = NEW_MAGIC \
+           + struct.pack('<IIB3xI12x', len(entries), len(strings), 2, 0)
+
+    with open(path, 'wb') as f:
+        f.write(header + table + strings)
+
+def writeOldLdsoCache(path, entries):
+    OLD_MAGIC = b'ld.so-1.7.0'
+    strings = b''
+    table = b''
+
+    for soname, libPath, flags in entries:
+        key = len(strings)
+        strings += soname.encode() + b'\0'
+        value = len(strings)
+        strings += libPath.encode() + b'\0'
+        table += struct.pack('=iII', flags, key, value)
+
+    with open(path, 'wb') as f:
+        f.write(OLD_MAGIC + b'\0' + struct.pack('=I', len(entries)) + table + strings)
+
+class TestDump(unittest.TestCase):
+    def testFixtures(self):
+        # The output of the parser before it was rewritten over mmap.
+        with open(os.path.join(FIXTURES_DIR, 'dumps.json')) as f:
+            expected = json.load(f)
+
+        for binary, info in expected.items():
+            dump = DTBinaryElf.dump(os.path.join(FIXTURES_DIR, binary))
+            dump = {key: sorted(value) if isinstance(value, set) else value
+                    for key, value in dump.items()}
+            self.assertEqual(dump, info, binary)
+
+    def testTruncated(self):
+        with open(os.path.join(FIXTURES_DIR, 'app'), 'rb') as f:
+            data = f.read()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for size in [16, 64, len(data) // 2]:
+                path = os.path.join(tmpdir, 'app')
+
+                with open(path, 'wb') as f:
+                    f.write(data[: size])
+
+                self.assertIsInstance(DTBinaryElf.dump(path), dict)
+
+class TestLdsoCache(unittest.TestCase):
+    def setUp(self):
+        self.globals = (DTBinaryElf.LDSO_CACHE,
+                        DTBinaryElf.USE_LDSO_CACHE,
+                        DTBinaryElf.LD_LIBRARY_PATH,
+                        DTBinaryElf.LIBS_SEARCH_PATHS)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        DTBinaryElf.LDSO_CACHE, \
+        DTBinaryElf.USE_LDSO_CACHE, \
+        DTBinaryElf.LD_LIBRARY_PATH, \
+        DTBinaryElf.LIBS_SEARCH_PATHS = self.globals
+        shutil.rmtree(self.tmpdir)
+
+    def testNewFormat(self):
+        cache = os.path.join(self.tmpdir, 'ld.so.cache')
+        writeLdsoCache(cache,
+                       [('libfoo.so.1', '/lib/glibc-hwcaps/x86-64-v3/libfoo.so.1', 0x303, 1 << 62),
+                        ('libfoo.so.1', '/lib/libfoo.so.1', 0x303, 0),
+                        ('libbar.so', '/lib/libbar.so', 0x303, 0)])
+        self.assertEqual(DTBinaryElf.readLdsoCache(cache),
+                         {'libfoo.so.1': [('/lib/glibc-hwcaps/x86-64-v3/libfoo.so.1', 0x303, 1 << 62),
+                                          ('/lib/libfoo.so.1', 0x303, 0)],
+                          'libbar.so': [('/lib/libbar.so', 0x303, 0)]})
+
+    def testOldFormat(self):
+        cache = os.path.join(self.tmpdir, 'ld.so.cache')
+        writeOldLdsoCache(cache,
+                          [('libfoo.so.1', '/lib/libfoo.so.1', 3),
+                           ('libbar.so', '/lib/libbar.so', 3)])
+        self.assertEqual(DTBinaryElf.readLdsoCache(cache),
+                         {'libfoo.so.1': [('/lib/libfoo.so.1', 3, 0)],
+                          'libbar.so': [('/lib/libbar.so', 3, 0)]})
+
+    def testSkipHwcaps(self):
+        hwcapsDir = os.path.join(self.tmpdir, 'glibc-hwcaps', 'x86-64-v3')
+        os.makedirs(hwcapsDir)
+        lib = os.path.join(FIXTURES_DIR, 'libfoo.so.1')
+        shutil.copy(lib, hwcapsDir)
+        shutil.copy(lib, self.tmpdir)
+        cache = os.path.join(self.tmpdir, 'ld.so.cache')
+        writeLdsoCache(cache,
+                       [('libfoo.so.1', os.path.join(hwcapsDir, 'libfoo.so.1'), 0x303, 1 << 62),
+                        ('libfoo.so.1', os.path.join(self.tmpdir, 'libfoo.so.1'), 0x303, 0)])
+        DTBinaryElf.LDSO_CACHE = DTBinaryElf.readLdsoCache(cache)
+        DTBinaryElf.USE_LDSO_CACHE = True
+        DTBinaryElf.LD_LIBRARY_PATH = []
+        DTBinaryElf.LIBS_SEARCH_PATHS = []
+        machine = DTBinaryElf.dump(lib)['machine']
+        self.assertEqual(DTBinaryElf.libPath('libfoo.so.1', machine, [], []),
+                         os.path.join(self.tmpdir, 'libfoo.so.1'))
+
+    @unittest.skipUnless(shutil.which('ldconfig') or os.path.exists('/sbin/ldconfig'),
+                         'ldconfig not available')
+    @unittest.skipUnless(os.path.exists('/etc/ld.so.cache'),
+                         'ld.so.cache not available')
+    def testLdconfig(self):
+        ldconfig = shutil.which('ldconfig') or '/sbin/ldconfig'
+        process = subprocess.run([ldconfig, '-p'], # nosec
+                                 stdout=subprocess.PIPE,
+                                 universal_newlines=True,
+                                 check=True)
+        expected = set()
+
+        for line in process.stdout.splitlines():
+            if not ' => ' in line:
+                continue
+
+            soname, _, path = line.strip().partition(' => ')
+            expected.add((soname.split(' (')[0], path))
+
+        cache = DTBinaryElf.readLdsoCache('/etc/ld.so.cache')
+        entries = {(soname, path)
+                   for soname, libs in cache.items()
+                   for path, _, _ in libs}
+        self.assertEqual(entries, expected)
+
+class TestSetRunpath(unittest.TestCase):
+    # Dynamic section entries
+    DT_NEEDED = 1
+    DT_RPATH = 15
+    DT_RUNPATH = 0x1d
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def copyFixture(self, binary):
+        path = os.path.join(self.tmpdir, binary)
+        shutil.copy(os.path.join(FIXTURES_DIR, binary), path)
+
+        return path
+
+    def dynamicEntries(self, binary):
+        with open(binary, 'rb') as f:
+            data = f.read()
+
+        header = DTBinaryElf.readHeader(data)
+        entries = []
+
+        for section in header['sections']:
+            if section['type'] == 0x6:
+                entries += [entry[1:]
+                            for entry in DTBinaryElf.readDynamicEntries(data,
+                                                                        header,
+                                                                        section)]
+
+        return entries
+
+    def otherEntries(self, binary):
+        return [entry
+                for entry in self.dynamicEntries(binary)
+                if entry[0] not in [self.DT_RPATH, self.DT_RUNPATH]]
+
+    def testShorterRunpath(self):
+        binary = self.copyFixture('app')
+        entries = self.otherEntries(binary)
+        info = DTBinaryElf.dump(binary)
+        self.assertTrue(DTBinaryElf.setRunpath(binary, '$ORIGIN/lib'))
+        newInfo = DTBinaryElf.dump(binary)
+        self.assertEqual(newInfo['runpath'], {'$ORIGIN/lib'})
+        self.assertEqual(newInfo['rpath'], set())
+        self.assertEqual(newInfo['imports'], info['imports'])
+        self.assertEqual(self.otherEntries(binary), entries)
+
+    def testEqualLengthRunpath(self):
+        binary = self.copyFixture('app')
+        entries = self.otherEntries(binary)
+        self.assertTrue(DTBinaryElf.setRunpath(binary, '$ORIGIN/../abc'))
+        self.assertEqual(DTBinaryElf.dump(binary)['runpath'], {'$ORIGIN/../abc'})
+        self.assertEqual(self.otherEntries(binary), entries)
+
+    def testLongerRunpath(self):
+        # The caller must fall back to patchelf.
+        binary = self.copyFixture('app')
+
+        with open(binary, 'rb') as f:
+            data = f.read()
+
+        self.assertFalse(DTBinaryElf.setRunpath(binary, '$ORIGIN/../lib/longer'))
+
+        with open(binary, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+    def testRpathToRunpath(self):
+        binary = self.copyFixture('libfoo.so.1')
+        entries = self.otherEntries(binary)
+        self.assertTrue(DTBinaryElf.setRunpath(binary, '$ORIGIN'))
+        info = DTBinaryElf.dump(binary)
+        self.assertEqual(info['runpath'], {'$ORIGIN'})
+        self.assertEqual(info['rpath'], set())
+        self.assertEqual([entry[0]
+                          for entry in self.dynamicEntries(binary)
+                          if entry[0] in [self.DT_RPATH, self.DT_RUNPATH]],
+                         [self.DT_RUNPATH])
+        self.assertEqual(self.otherEntries(binary), entries)
+
+    def testSharedString(self):
+        # Make a DT_NEEDED entry point inside of the runpath string, like a
+        # linker merging the string tails would do.
+        with open(os.path.join(FIXTURES_DIR, 'app'), 'rb') as f:
+            data = bytearray(f.read())
+
+        header = DTBinaryElf.readHeader(data)
+        dynamic = [section
+                   for section in header['sections']
+                   if section['type'] == 0x6][0]
+        entries = DTBinaryElf.readDynamicEntries(data, header, dynamic)
+        runpath = [dVal
+                   for _, dTag, dVal in entries
+                   if dTag == self.DT_RUNPATH][0]
+        needed = [offset
+                  for offset, dTag, _ in entries
+                  if dTag == self.DT_NEEDED][0]
+        struct.pack_into(DTBinaryElf.dynamicFormat(header),
+                         data,
+                         needed,
+                         self.DT_NEEDED,
+                         runpath + 1)
+        original = bytes(data)
+        self.assertFalse(DTBinaryElf.setRunpathMapped(data, b'$ORIGIN'))
+        self.assertEqual(bytes(data), original)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2021  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import configparser
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WebcamoidDeployTools import DTArchive
+from WebcamoidDeployTools import DTCompressedTarZst
+
+
+@unittest.skipIf(DTCompressedTarZst.zstd is None,
+                 'compression.zstd is not available, requires Python 3.14')
+class TestCompressedTarZst(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.dataDir = os.path.join(self.tmpDir, 'data')
+        self.outputDir = os.path.join(self.tmpDir, 'out')
+        os.makedirs(os.path.join(self.dataDir, 'bin'))
+        os.makedirs(self.outputDir)
+        self.files = {'bin/random': os.urandom(100000),
+                      'text': '\n'.join(str(i) for i in range(10000)).encode()}
+
+        for path, data in self.files.items():
+            with open(os.path.join(self.dataDir, path), 'wb') as f:
+                f.write(data)
+
+        os.symlink('text', os.path.join(self.dataDir, 'link'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def configs(self, options):
+        configs = configparser.ConfigParser()
+        configs.read_dict({'Package': {'name': 'app',
+                                       'version': '1.0.0',
+                                       'targetPlatform': 'posix',
+                                       'targetArch': 'x86_64'},
+                           'CompressedTarZst': options})
+
+        return configs
+
+    def runFormat(self, globs, configs):
+        DTCompressedTarZst.run(globs,
+                               configs,
+                               self.dataDir,
+                               self.outputDir,
+                               threading.Lock())
+        self.assertEqual(globs['outputPackages'],
+                         [os.path.join(self.outputDir,
+                                       'app-posix-1.0.0-x86_64.tar.zst')])
+
+        return globs['outputPackages'][0]
+
+    def checkPackage(self, package):
+        with tarfile.open(package, 'r:zst') as tar:
+            self.assertEqual(sorted(tar.getnames()),
+                             ['app', 'app/bin', 'app/bin/random', 'app/link', 'app/text'])
+            self.assertEqual(tar.getmember('app/link').linkname, 'text')
+
+            for path, data in self.files.items():
+                self.assertEqual(tar.extractfile('app/' + path).read(), data)
+
+    def testRun(self):
+        self.checkPackage(self.runFormat({}, self.configs({'level': '3'})))
+
+    def testLongDistance(self):
+        configs = self.configs({'level': '3',
+                                'longDistance': 'true',
+                                'threads': '2'})
+        self.checkPackage(self.runFormat({}, configs))
+
+    def testDataTree(self):
+        stream = DTArchive.DataTreeStream(self.dataDir,
+                                          'app',
+                                          ['CompressedTarZst'])
+        stream.start()
+
+        try:
+            package = self.runFormat({'dataTree': stream},
+                                self.configs({'level': '3'}))
+        finally:
+            stream.detach('CompressedTarZst')
+            stream.join()
+
+        self.checkPackage(package)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2021  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WebcamoidDeployTools import DTScheduler
+
+
+class FakeRun:
+    # Records how the formats are started instead of packaging anything.
+    def __init__(self, rss={}, delay=0.05):
+        self.rss = rss
+        self.delay = delay
+        self.mutex = threading.Lock()
+        self.started = []
+        self.running = set()
+        self.overlaps = []
+
+    def __call__(self, format, threads):
+        with self.mutex:
+            self.started.append((format, threads))
+            self.running.add(format)
+            self.overlaps.append(set(self.running))
+
+        time.sleep(self.delay)
+
+        with self.mutex:
+            self.running.remove(format)
+
+        return self.rss.get(format, 0)
+
+class TestRunJobs(unittest.TestCase):
+    def history(self, durations={}, rss={}):
+        history = DTScheduler.JobHistory('', 'app')
+
+        for format, duration in durations.items():
+            history.record(format, duration, rss.get(format, 0))
+
+        return history
+
+    def testThreadsSplit(self):
+        history = self.history()
+        jobs = DTScheduler.packagingJobs(['Zip', 'Tar'], [], history)
+        run = FakeRun()
+        DTScheduler.runJobs(jobs, run, history, 8)
+        self.assertEqual(sorted(run.started), [('Tar', 4), ('Zip', 4)])
+        self.assertEqual(run.overlaps[-1], {'Zip', 'Tar'})
+
+    def testGroupThreadsSplit(self):
+        # The formats of a group start together and share the threads.
+        history = self.history()
+        jobs = DTScheduler.packagingJobs(['Zip', 'Tar', 'Xz'],
+                                         [['Tar', 'Xz']],
+                                         history)
+        run = FakeRun()
+        DTScheduler.runJobs(jobs, run, history, 6)
+        self.assertEqual(run.started, [('Zip', 2), ('Tar', 2), ('Xz', 2)])
+
+    def testLongestFirst(self):
+        history = self.history({'Zip': 1, 'Tar': 10, 'Xz': 5})
+        jobs = DTScheduler.packagingJobs(['Zip', 'Tar', 'Xz', 'Dmg'],
+                                         [],
+                                         history)
+        run = FakeRun(delay=0)
+        DTScheduler.runJobs(jobs, run, history, 1)
+
+        # Never measured formats first, one at a time.
+        self.assertEqual(run.started,
+                         [('Dmg', 1), ('Tar', 1), ('Xz', 1), ('Zip', 1)])
+        self.assertTrue(all(len(running) == 1 for running in run.overlaps))
+
+    def testRecordsHistory(self):
+        history = self.history()
+        jobs = DTScheduler.packagingJobs(['Zip'], [], history)
+        DTScheduler.runJobs(jobs, FakeRun({'Zip': 1000}, 0), history, 1)
+        self.assertIsNotNone(history.duration('Zip'))
+        self.assertEqual(history.rss('Zip'), 1000)
+
+    def testMemoryLimit(self):
+        rss = {'Zip': 600, 'Tar': 600, 'Xz': 300}
+        history = self.history({'Zip': 3, 'Tar': 2, 'Xz': 1}, rss)
+        jobs = DTScheduler.packagingJobs(['Zip', 'Tar', 'Xz'], [], history)
+        run = FakeRun(rss)
+        DTScheduler.runJobs(jobs, run, history, 4, 1000)
+
+        # Tar doesn't fit with Zip, but Xz does.
+        self.assertEqual([format for format, _ in run.started],
+                         ['Zip', 'Xz', 'Tar'])
+
+        for running in run.overlaps:
+            self.assertLessEqual(sum(rss[format] for format in running), 1000)
+
+    def testJobBiggerThanMemory(self):
+        # It still runs, alone.
+        rss = {'Zip': 2000, 'Tar': 100}
+        history = self.history({'Zip': 2, 'Tar': 1}, rss)
+        jobs = DTScheduler.packagingJobs(['Zip', 'Tar'], [], history)
+        run = FakeRun(rss)
+        DTScheduler.runJobs(jobs, run, history, 4, 1000)
+        self.assertEqual([format for format, _ in run.started], ['Zip', 'Tar'])
+        self.assertTrue(all(len(running) == 1 for running in run.overlaps))
+
+    def testUnknownMemory(self):
+        # The formats running in the main process have no memory measured,
+        # they are not held back by the limit.
+        history = self.history({'Zip': 2, 'Tar': 1})
+        jobs = DTScheduler.packagingJobs(['Zip', 'Tar'], [], history)
+        run = FakeRun()
+        DTScheduler.runJobs(jobs, run, history, 4, 1)
+        self.assertEqual(run.overlaps[-1], {'Zip', 'Tar'})
+
+if __name__ == '__main__':
+    unittest.main()
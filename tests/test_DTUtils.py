@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Webcamoid Deploy Tools.
+# Copyright (C) 2021  Gonzalo Exequiel Pedone
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Web-Site: http://github.com/webcamoid/DeployTools/
+
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WebcamoidDeployTools import DTBinary
+from WebcamoidDeployTools import DTUtils
+
+
+class TestCopyManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpDir, 'src')
+        self.dst = os.path.join(self.tmpDir, 'data', 'dst')
+        self.manifest = os.path.join(self.tmpDir, '.data.copies.json')
+        os.makedirs(os.path.dirname(self.dst))
+
+        with open(self.src, 'w') as f:
+            f.write('source')
+
+    def tearDown(self):
+        DTUtils.closeCopyManifest()
+        shutil.rmtree(self.tmpDir)
+
+    def copy(self, skipUnchanged=True):
+        DTUtils.openCopyManifest(self.manifest, False, skipUnchanged)
+        skipped = DTUtils.copyStats()['skipped']
+        DTUtils.copy(self.src, self.dst)
+
+        return DTUtils.copyStats()['skipped'] - skipped
+
+    def modifyCopy(self):
+        # Like stripping or patching the copy after copying it.
+        with open(self.dst, 'a') as f:
+            f.write(' modified')
+
+    def testSkipsPostProcessedCopies(self):
+        self.assertEqual(self.copy(), 0)
+        self.modifyCopy()
+        DTUtils.closeCopyManifest()
+        self.assertEqual(self.copy(), 1)
+
+        with open(self.dst) as f:
+            self.assertEqual(f.read(), 'source modified')
+
+    def testCopiesChangedSources(self):
+        self.copy()
+        DTUtils.closeCopyManifest()
+
+        with open(self.src, 'w') as f:
+            f.write('changed source')
+
+        self.assertEqual(self.copy(), 0)
+
+    def testCopiesModifiedCopies(self):
+        self.copy()
+        DTUtils.closeCopyManifest()
+        self.modifyCopy()
+        self.assertEqual(self.copy(), 0)
+
+        with open(self.dst) as f:
+            self.assertEqual(f.read(), 'source')
+
+    def testForce(self):
+        self.copy()
+        DTUtils.closeCopyManifest()
+        self.assertEqual(self.copy(False), 0)
+
+class TestStagingDir(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testOutputDir(self):
+        with DTUtils.stagingDir(self.tmpDir) as stagingDir:
+            self.assertEqual(os.path.dirname(stagingDir), self.tmpDir)
+
+        self.assertEqual(os.listdir(self.tmpDir), [])
+
+    def testFallback(self):
+        outputDir = os.path.join(self.tmpDir, 'missing')
+
+        with DTUtils.stagingDir(outputDir) as stagingDir:
+            self.assertEqual(os.path.dirname(stagingDir), tempfile.gettempdir())
+
+    def testCopyManifestPath(self):
+        cacheDir = os.path.join(self.tmpDir, 'cache')
+        manifest = DTUtils.copyManifestPath(cacheDir, 'data')
+        self.assertEqual(os.path.dirname(manifest), cacheDir)
+        self.assertEqual(manifest,
+                         DTUtils.copyManifestPath(cacheDir, os.path.abspath('data')))
+        self.assertNotEqual(manifest, DTUtils.copyManifestPath(cacheDir, 'data2'))
+
+class TestOrderedParallelMap(unittest.TestCase):
+    def testOrder(self):
+        for nthreads in [1, 4]:
+            self.assertEqual(list(DTUtils.orderedParallelMap(lambda x: 2 * x,
+                                                             range(100),
+                                                             nthreads)),
+                             [2 * x for x in range(100)])
+
+    def testMaxWeight(self):
+        running = []
+        maxRunning = []
+        mutex = threading.Lock()
+
+        def function(item):
+            with mutex:
+                running.append(item)
+                maxRunning.append(sum(running))
+
+            time.sleep(0.01)
+
+            with mutex:
+                running.remove(item)
+
+            return item
+
+        items = [3, 1, 1, 5, 1, 2, 2, 1]
+        results = DTUtils.orderedParallelMap(function,
+                                             items,
+                                             4,
+                                             lambda item: item,
+                                             4)
+        self.assertEqual(list(results), items)
+
+        # The heavy item is processed alone.
+        self.assertLessEqual(max(maxRunning), 5)
+
+
+class TestMove(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpDir, 'src')
+        self.dst = os.path.join(self.tmpDir, 'data', 'dst')
+        os.makedirs(os.path.join(self.src, 'sub'))
+        self.writeFile(os.path.join(self.src, 'a'), 'a')
+        self.writeFile(os.path.join(self.src, 'sub', 'b'), 'b')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def writeFile(self, path, contents):
+        with open(path, 'w') as f:
+            f.write(contents)
+
+    def readFile(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def testRename(self):
+        ino = os.stat(os.path.join(self.src, 'sub', 'b')).st_ino
+        self.assertTrue(DTUtils.move(self.src, self.dst))
+
+        self.assertFalse(os.path.exists(self.src))
+        self.assertEqual(self.readFile(os.path.join(self.dst, 'a')), 'a')
+        self.assertEqual(os.stat(os.path.join(self.dst, 'sub', 'b')).st_ino, ino)
+
+    def testMergeIntoExistingDestination(self):
+        os.makedirs(os.path.join(self.dst, 'sub'))
+        self.writeFile(os.path.join(self.dst, 'a'), 'old')
+        self.writeFile(os.path.join(self.dst, 'sub', 'c'), 'c')
+        self.assertTrue(DTUtils.move(self.src, self.dst))
+
+        self.assertFalse(os.path.exists(self.src))
+        self.assertEqual(self.readFile(os.path.join(self.dst, 'a')), 'a')
+        self.assertEqual(self.readFile(os.path.join(self.dst, 'sub', 'b')), 'b')
+        self.assertEqual(self.readFile(os.path.join(self.dst, 'sub', 'c')), 'c')
+
+    def testCrossDeviceFallback(self):
+        def rename(src, dst):
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+        with unittest.mock.patch('os.rename', rename), \
+             unittest.mock.patch('os.replace', rename):
+            self.assertTrue(DTUtils.move(self.src, self.dst))
+
+        self.assertEqual(self.readFile(os.path.join(self.dst, 'a')), 'a')
+        self.assertEqual(self.readFile(os.path.join(self.dst, 'sub', 'b')), 'b')
+        self.assertFalse(os.path.exists(os.path.join(self.src, 'sub', 'b')))
+
+    @unittest.skipUnless(os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK),
+                         'needs a writable /dev/shm')
+    def testCrossDevice(self):
+        otherDir = tempfile.mkdtemp(dir='/dev/shm')
+        self.addCleanup(shutil.rmtree, otherDir)
+
+        if os.stat(otherDir).st_dev == os.stat(self.tmpDir).st_dev:
+            self.skipTest('/dev/shm is in the same file system')
+
+        dst = os.path.join(otherDir, 'dst')
+        self.assertTrue(DTUtils.move(self.src, dst))
+
+        self.assertEqual(self.readFile(os.path.join(dst, 'a')), 'a')
+        self.assertEqual(self.readFile(os.path.join(dst, 'sub', 'b')), 'b')
+        self.assertFalse(os.path.exists(os.path.join(self.src, 'sub', 'b')))
+
+    def testInvalidatesScans(self):
+        index = DTBinary.ScanIndex()
+
+        with unittest.mock.patch.object(index, 'invalidate') as invalidate:
+            DTUtils.move(self.src, self.dst)
+
+        invalidate.assert_any_call(self.src)
+        invalidate.assert_any_call(self.dst)
+
+
+if __name__ == '__main__':
+    unittest.main()